@@ -7,11 +7,17 @@ Created on Fri Nov 12 09:50:15 2021
 
 from statistics import mean
 import random
-import copy
 import collections
+import copy
+import functools
+import multiprocessing
 import numbers
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from enum import Enum
-from math import sqrt
+from math import floor, sqrt
 
 # from ipythonblocks import BlockGrid
 # from IPython.display import HTML, display, clear_output
@@ -73,7 +79,11 @@ class Agent(Thing):
     that needs a model of the world (and of the agent itself) will have to
     build and maintain its own model. There is an optional slot, .performance,
     which is a number giving the performance measure of the agent in its
-    environment."""
+    environment. .random is the random number generator that the program
+    should draw from (the random module unless the agent is given its own,
+    see AgentRuns)."""
+
+    random = random
 
     def __init__(self, program=None):
         self.alive = True  # indicates if the agent is incurred alive, initially True
@@ -100,7 +110,7 @@ class RandomAgent(Agent):
     "An agent that chooses an action at random, ignoring all percepts."
 
     def __init__(self, actions):
-        Agent.__init__(self, lambda percept: random.choice(actions))
+        Agent.__init__(self, lambda percept: self.random.choice(actions))
         # self.program = lambda percept:  random.choice(actions)
 
 
@@ -129,7 +139,10 @@ class Environment:
     The environment keeps a list of .things and .agents (which is a subset
     of .things). Each agent has a .performance slot, initialized to 0.
     Each thing has a .location slot, even though some environments may not
-    need this."""
+    need this. Random choices are drawn from .random (the random module
+    unless the environment is given its own generator, see AgentRuns)."""
+
+    random = random
 
     def __init__(self):
         self.things = []
@@ -384,7 +397,14 @@ class XYEnvironment(Environment):
     Agents perceive things within a radius. Each agent in the
     environment has a .location slot which should be a location such
     as (0, 1), and a .holding slot, which should be a list of things
-    that are held."""
+    that are held.
+
+    Things are indexed by location (and, at each location, by class), so
+    list_things_at and some_things_at do not scan the whole world. The index
+    is kept up to date by add_thing, delete_thing and move_to: move things
+    with move_to rather than by assigning their .location.
+    Things are also bucketed in a uniform grid of cell_size x cell_size
+    cells, so things_near only looks at the cells that the radius covers."""
 
     def __init__(self, width=10, height=10):
         super().__init__()
@@ -392,20 +412,90 @@ class XYEnvironment(Environment):
         self.width = width
         self.height = height
         self.observers = []
+        self.things_by_location = {}  # location -> {class: [things]}
+        self.indexed_location = {}  # thing -> location under which it is indexed
+        self.things_by_cell = {}  # (cx, cy) -> [things] in that cell of the uniform grid
         # Sets iteration start and end (no walls).
         self.x_start, self.y_start = (0, 0)
         self.x_end, self.y_end = (self.width, self.height)
 
     perceptible_distance = 1
+    cell_size = 1  # side of the cells of the uniform grid used by things_near
+
+    @staticmethod
+    def location_key(location):
+        """Locations may be lists or tuples; the index uses tuples."""
+        if isinstance(location, numbers.Number):
+            return location
+        return tuple(location)
+
+    def cell_of(self, location):
+        """Return the uniform grid cell that contains an (x, y) location."""
+        x, y = location
+        return floor(x / self.cell_size), floor(y / self.cell_size)
+
+    def index_thing(self, thing):
+        """Register thing at its current location in the location index."""
+        key = self.location_key(thing.location)
+        self.things_by_location.setdefault(key, {}).setdefault(thing.__class__, []).append(thing)
+        self.indexed_location[thing] = key
+        if not isinstance(key, numbers.Number):
+            self.things_by_cell.setdefault(self.cell_of(key), []).append(thing)
+
+    def unindex_thing(self, thing):
+        """Remove thing from the location index (if it is there)."""
+        key = self.indexed_location.pop(thing, None)
+        if key is None:
+            return
+        buckets = self.things_by_location[key]
+        bucket = buckets[thing.__class__]
+        bucket.remove(thing)
+        if not bucket:
+            del buckets[thing.__class__]
+            if not buckets:
+                del self.things_by_location[key]
+        if not isinstance(key, numbers.Number):
+            cell = self.cell_of(key)
+            bucket = self.things_by_cell[cell]
+            bucket.remove(thing)
+            if not bucket:
+                del self.things_by_cell[cell]
+
+    def list_things_at(self, location, tclass=Thing):
+        """Return all things exactly at a given location."""
+        buckets = self.things_by_location.get(self.location_key(location))
+        if not buckets:
+            return []
+        return [thing for cls, bucket in buckets.items() if issubclass(cls, tclass)
+                for thing in bucket]
+
+    def some_things_at(self, location, tclass=Thing):
+        """Return true if at least one of the things at location
+        is an instance of class tclass (or a subclass)."""
+        buckets = self.things_by_location.get(self.location_key(location))
+        return bool(buckets) and any(issubclass(cls, tclass) for cls in buckets)
 
     def things_near(self, location, radius=None):
         """Return all things within radius of location."""
         if radius is None:
             radius = self.perceptible_distance
         radius2 = radius * radius
-        return [(thing, radius2 - distance_squared(location, thing.location))
-                for thing in self.things if distance_squared(
-                location, thing.location) <= radius2]
+        x, y = location
+        cx0, cy0 = self.cell_of((x - radius, y - radius))
+        cx1, cy1 = self.cell_of((x + radius, y + radius))
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.things):
+            # the radius covers more cells than there are things: just scan them
+            return [(thing, radius2 - distance_squared(location, thing.location))
+                    for thing in self.things if distance_squared(
+                    location, thing.location) <= radius2]
+        near = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for thing in self.things_by_cell.get((cx, cy), ()):
+                    d2 = distance_squared(location, thing.location)
+                    if d2 <= radius2:
+                        near.append((thing, radius2 - d2))
+        return near
 
     def percept(self, agent):
         """By default, agent perceives things within a default radius."""
@@ -445,7 +535,9 @@ class XYEnvironment(Environment):
         If thing is holding anything, they move with him."""
         thing.bump = self.some_things_at(destination, Obstacle)
         if not thing.bump:
+            self.unindex_thing(thing)
             thing.location = destination
+            self.index_thing(thing)
             for o in self.observers:
                 o.thing_moved(thing)
             for t in thing.holding:
@@ -457,13 +549,17 @@ class XYEnvironment(Environment):
     def add_thing(self, thing, location=None, exclude_duplicate_class_items=False):
         """Add things to the world. If (exclude_duplicate_class_items) then the item won't be
         added if the location has at least one item of the same class."""
+        nb_things = len(self.things)
         if location is None:
             super().add_thing(thing)
         elif self.is_inbounds(location):
             if (exclude_duplicate_class_items and
-                    any(isinstance(t, thing.__class__) for t in self.list_things_at(location))):
+                    self.some_things_at(location, thing.__class__)):
                 return
             super().add_thing(thing, location)
+        if len(self.things) > nb_things:
+            # the thing actually added (a program is wrapped into an Agent)
+            self.index_thing(self.things[-1])
 
     def is_inbounds(self, location):
         """Checks to make sure that the location is inbounds (within walls if we have walls)"""
@@ -472,12 +568,12 @@ class XYEnvironment(Environment):
 
     def random_location_inbounds(self, exclude=None):
         """Returns a random location that is inbounds (within walls if we have walls)"""
-        location = (random.randint(self.x_start, self.x_end),
-                    random.randint(self.y_start, self.y_end))
+        location = (self.random.randint(self.x_start, self.x_end),
+                    self.random.randint(self.y_start, self.y_end))
         if exclude is not None:
             while location == exclude:
-                location = (random.randint(self.x_start, self.x_end),
-                            random.randint(self.y_start, self.y_end))
+                location = (self.random.randint(self.x_start, self.x_end),
+                            self.random.randint(self.y_start, self.y_end))
         return location
 
     def delete_thing(self, thing):
@@ -486,6 +582,7 @@ class XYEnvironment(Environment):
             del thing.holding
 
         super().delete_thing(thing)
+        self.unindex_thing(thing)
         for obs in self.observers:
             obs.thing_deleted(thing)
 
@@ -540,23 +637,59 @@ def trace_agent(agent, text_box):
 # ==============================================================================
 # ===================Performance test and comparison============================
 
-def compare_agents(EnvFactory, AgentFactories, n=10, steps=1000):
+class EnvironmentTemplate:
+    """A compact, immutable snapshot of an environment: its pickle, taken once.
+    instantiate() returns a fresh copy, which is much cheaper than
+    copy.deepcopy of the environment (walls included), and the bytes are
+    shared copy-on-write by forked worker processes.
+    Environments that cannot be pickled, e.g. because one of their agents
+    runs a lambda, are kept as a deep copy and deep-copied again instead.
+    The agents run in the copies are added at location (the default location
+    of the environment if None)."""
+
+    def __init__(self, env, location=None):
+        self.location = location
+        try:
+            self.data = pickle.dumps(env, pickle.HIGHEST_PROTOCOL)
+            self.env = None
+        except (pickle.PicklingError, AttributeError, TypeError):
+            self.data = None
+            self.env = copy.deepcopy(env)
+
+    def instantiate(self):
+        if self.data is None:
+            return copy.deepcopy(self.env)
+        return pickle.loads(self.data)
+
+
+def compare_agents(EnvFactory, AgentFactories, n=10, steps=1000, workers=None, seed=0):
     """See how well each of several agents do in n instances of an environment.
     Pass in a factory (constructor) for environments, and several for agents.
     Create n instances of the environment, and run each agent in copies of
     each one for steps. Return a list of (agent, average-score) tuples.
+    The runs are spread over workers processes (see run_agents); the i-th
+    environment is created and run with the random seed seed + i, so the
+    results do not depend on the number of workers. The state of the random
+    module is restored afterwards.
     """
-    envs = []
     if callable(EnvFactory):
-        envs = [EnvFactory() for i in range(n)]
+        templates = []
+        state = random.getstate()
+        try:
+            for i in range(n):
+                random.seed(seed + i)
+                templates.append(EnvironmentTemplate(EnvFactory()))
+        finally:
+            random.setstate(state)
     else:
-        envs = [copy.deepcopy(EnvFactory) for i in range(n)]
-    return [(A, test_agent(A, steps, copy.deepcopy(envs)))
-            for A in AgentFactories]
+        templates = [EnvironmentTemplate(EnvFactory)] * n
+    scores = run_agents(AgentFactories, templates, steps, workers, seed)
+    return [(A, mean(A_scores)) for A, A_scores in zip(AgentFactories, scores)]
 
 
-def test_agent(AgentFactory, steps, envs):
+def test_agent(AgentFactory, steps, envs, workers=None, seed=0):
     """Return the mean score of running an agent in each of the envs, for steps
+    (envs are environments or EnvironmentTemplates; they are not modified)
     >>> def constant_prog(percept):
     ...     return percept
     ...
@@ -565,13 +698,123 @@ def test_agent(AgentFactory, steps, envs):
     >>> result == 5
     True
     """
-
-    def score(env):
-        agent = AgentFactory()
-        env.add_thing(agent)
-        env.run(steps)
-        return agent.performance
-
-    return mean(map(score, envs))
+    templates = [env if isinstance(env, EnvironmentTemplate) else EnvironmentTemplate(env)
+                 for env in envs]
+    return mean(run_agents([AgentFactory], templates, steps, workers, seed)[0])
+
+
+def run_agents(AgentFactories, templates, steps, workers=None, seed=0):
+    """Run each agent in a fresh copy of each environment template for steps,
+    and return scores, where scores[a][i] is the performance of the agent of
+    AgentFactories[a] in templates[i] (see AgentRuns)."""
+    runs = AgentRuns(AgentFactories, templates, steps, workers, seed)
+    runs.start()
+    return runs.scores()
+
+
+class AgentRuns:
+    """The runs of each agent of AgentFactories in a fresh copy of each
+    environment template, for steps. Run (a, i) starts from its own
+    random.Random(seed + i), given to the environment and to the agent as
+    their .random, and the random module is seeded with seed + i too, so the
+    results do not depend on the number of workers.
+    start() spreads the runs over workers processes (one per CPU by default)
+    when processes can be forked, so that the factories (often lambdas) and
+    the templates are inherited instead of pickled. Otherwise the random
+    module is shared, so the runs are made one after the other in a single
+    thread, which restores the state of the random module after each run
+    (drawing from it in another thread meanwhile breaks reproducibility).
+    It does not wait: callback(a, i, performance) is called (in a thread of
+    this process) as each run finishes. cancel() drops the queued runs and
+    stops the ones in progress at their next step, with a performance of
+    None."""
+
+    def __init__(self, AgentFactories, templates, steps, workers=None, seed=0):
+        self.runs = (AgentFactories, templates, steps)
+        self.jobs = [(a, i, seed + i) for a in range(len(AgentFactories)) for i in range(len(templates))]
+        self.workers = min(workers or os.cpu_count() or 1, max(len(self.jobs), 1))
+        self.executor = None
+        self.futures = []
+        self.cancel_event = None
+
+    def start(self, callback=None):
+        """Submit all the runs and return their futures, in the order of jobs."""
+        if self.workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            self.cancel_event = context.Event()
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_set_runs,
+                                                initargs=(self.runs + (self.cancel_event,),))
+            run = _forked_run
+        else:
+            self.cancel_event = threading.Event()
+            self.executor = ThreadPoolExecutor(1)
+            run = functools.partial(_threaded_run, self.runs + (self.cancel_event,))
+        for a, i, seed in self.jobs:
+            future = self.executor.submit(run, a, i, seed)
+            if callback is not None:
+                future.add_done_callback(functools.partial(_report, callback, a, i))
+            self.futures.append(future)
+        return self.futures
+
+    def scores(self):
+        """Wait for all the runs and return scores, where scores[a][i] is the
+        performance of agent a in templates[i]."""
+        results = [future.result() for future in self.futures]
+        self.executor.shutdown()
+        AgentFactories, templates, _ = self.runs
+        n = len(templates)
+        return [results[a * n:(a + 1) * n] for a in range(len(AgentFactories))]
+
+    def cancel(self):
+        if self.executor is not None:
+            self.cancel_event.set()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _report(callback, a, i, future):
+    if not future.cancelled():
+        callback(a, i, future)
+
+
+# (agent factories, templates, steps, cancel event) of the AgentRuns of a
+# process pool, inherited by its forked workers
+_runs = None
+
+
+def _set_runs(runs):
+    global _runs
+    _runs = runs
+
+
+def _forked_run(a, i, seed):
+    random.seed(seed)
+    return _run(_runs, a, i, seed)
+
+
+def _threaded_run(runs, a, i, seed):
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        return _run(runs, a, i, seed)
+    finally:
+        random.setstate(state)
+
+
+def _run(runs, a, i, seed):
+    AgentFactories, templates, steps, cancel = runs
+    rng = random.Random(seed)
+    template = templates[i]
+    env = template.instantiate()
+    env.random = rng
+    agent = AgentFactories[a]()
+    agent.random = rng
+    env.add_thing(agent, template.location)
+    for step in range(steps):
+        if cancel.is_set():
+            return None
+        if env.is_done():
+            break
+        env.step()
+    return agent.performance
 
 # _________________________________________________________________________
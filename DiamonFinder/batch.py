@@ -0,0 +1,138 @@
+"""
+ Headless batch solver: many path queries over mazes, spread over processes.
+     for result in solve_batch([(maze30x30, 'a_star', 'manhattanHeuristic')] * 100):
+         print(result.index, result.cost, result.expanded)
+"""
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import search
+from grid import compile_costs, compile_maze
+from problem import NullObserver, Problem
+
+# maze is a layout (a list of strings); algorithm and heuristic are names of
+# search.py, as for SearchAgent; start and goals override the 'A' and the '*'
+# of the layout; terrain gives the cost of the cells (see grid.compile_costs)
+BatchJob = namedtuple('BatchJob', 'maze algorithm heuristic start goals terrain',
+                      defaults=('a_star', 'nullHeuristic', None, None, None))
+
+# cost is None when no path was found; path is the list of states from the start
+BatchResult = namedtuple('BatchResult', 'index cost expanded seconds path')
+
+
+class GridQueryProblem(search.CompiledDiamondExplorerProblem):
+    """A CompiledDiamondExplorerProblem built straight from a compiled maze,
+    without an environment: searching from start to the nearest of goals."""
+
+    def __init__(self, grid, start, goals, costs, observer=None):
+        Problem.__init__(self, start, list(goals), observer or NullObserver())
+        self.environment = None
+        self.grid = grid
+        self.costs = costs
+        self.goal_states = frozenset(goals)
+        self._width = grid.width
+        self._actions = grid.actions
+        self._moves = grid.moves
+        self._expanded = 0
+
+
+# (maze, terrain) -> (grid, start, goals, costs), compiled once by the parent
+# process: forked workers share it copy-on-write, spawned ones receive a copy
+_mazes = {}
+
+
+def _maze_key(job):
+    return tuple(job.maze), (tuple(job.terrain) if job.terrain else None)
+
+
+def _compile(maze, terrain):
+    grid = compile_maze(maze)
+    start, goals = None, []
+    for y, row in enumerate(maze):
+        for x, ch in enumerate(row):
+            if ch == 'A':
+                start = (x, y)
+            elif ch == '*':
+                goals.append((x, y))
+    return grid, start, goals, compile_costs(terrain, grid.width, grid.height)
+
+
+def _init_worker(mazes):
+    global _mazes
+    _mazes = mazes
+
+
+def _search_function(algorithm, heuristic):
+    """The search function of a job, given by names like SearchAgent's."""
+    func = getattr(search, algorithm, None)
+    if not callable(func):
+        raise AttributeError(algorithm + ' is not a search function in search.py.')
+    if 'heuristic' not in func.__code__.co_varnames:
+        return func
+    h = getattr(search, heuristic, None)
+    if not callable(h):
+        raise AttributeError(heuristic + ' is not a function.')
+    return lambda problem: func(problem, heuristic=h)
+
+
+def _solve(index, key, algorithm, heuristic, start, goals):
+    grid, maze_start, maze_goals, costs = _mazes[key]
+    problem = GridQueryProblem(grid, start or maze_start, maze_goals if goals is None else goals, costs)
+    search_function = _search_function(algorithm, heuristic)
+    begin = time.perf_counter()
+    node = search_function(problem)
+    if hasattr(node, '__next__'):  # an anytime search: keep its best solution
+        best = None
+        for best in node:
+            pass
+        node = best
+    seconds = time.perf_counter() - begin
+    if node is None:
+        return BatchResult(index, None, problem._expanded, seconds, None)
+    return BatchResult(index, node.path_cost, problem._expanded, seconds, [n.state for n in node.path()])
+
+
+def solve_batch(jobs, workers=None, ordered=False, window=None):
+    """Solve every job, a BatchJob or a tuple (maze, algorithm, heuristic[,
+    start, goals, terrain]), on a pool of worker processes and yield a
+    BatchResult for each, as soon as it is ready (in the order of the jobs if
+    ordered). The mazes are compiled once, before the workers start; then
+    only the job parameters travel to the workers and the results back.
+    At most window jobs (4 per worker by default) are in flight at a time."""
+    jobs = [BatchJob(*job) for job in jobs]
+    mazes = {}
+    for job in jobs:
+        key = _maze_key(job)
+        if key not in mazes:
+            mazes[key] = _compile(job.maze, job.terrain)
+    workers = workers or os.cpu_count() or 1
+    window = window or 4 * workers
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(mazes,)) as executor:
+        pending, ready, next_index = set(), {}, 0
+        todo = iter(enumerate(jobs))
+        while True:
+            for index, job in todo:
+                pending.add(executor.submit(_solve, index, _maze_key(job), job.algorithm,
+                                            job.heuristic, job.start, job.goals))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if not ordered:
+                    yield result
+                else:
+                    ready[result.index] = result
+            while next_index in ready:
+                yield ready.pop(next_index)
+                next_index += 1
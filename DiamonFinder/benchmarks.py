@@ -0,0 +1,233 @@
+"""
+ Benchmarks of the search machinery on generated mazes.
+ Run them from this directory, e.g.:
+     python benchmarks.py node_memory 1000
+"""
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from agents import Action, Agent
+from batch import BatchJob, solve_batch
+from diamond_2d_gui import DiamondMazeEnvironment, mazes
+from grid import Landmarks, compile_maze, generate_maze
+from problem import Node, NullObserver
+from search import CompiledDiamondExplorerProblem
+from search_algorithms import (aStarSearch, arrayAStarSearch, batchManhattanHeuristic, bidirectionalAStarSearch,
+                               bidirectionalBreadthFirstSearch, landmarkHeuristic, manhattanHeuristic,
+                               uniformCostSearch)
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process, in KB (Linux reports KB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# ______________________________________________________________________________
+# Node memory
+
+class DictNode:
+    """The search tree Node as it was before it got __slots__: every node
+    carries a __dict__, and the memoized f value is added to it."""
+
+    def __init__(self, state, parent=None, action=None, path_cost=0):
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.path_cost = path_cost
+        self.depth = 0
+        if parent:
+            self.depth = parent.depth + 1
+
+
+def build_search_tree(node_class, grid):
+    """Grow a breadth-first search tree over every free cell of grid, with
+    an f value attached to each node like best_first_graph_search does,
+    and return all the nodes."""
+    start = grid.cell_id((1, 1))
+    root = node_class(grid.cells[start])
+    root.f = 0
+    nodes = [root]
+    reached = bytearray(grid.size)
+    reached[start] = 1
+    i = 0
+    while i < len(nodes):
+        node = nodes[i]
+        i += 1
+        cell = grid.cell_id(node.state)
+        for k in range(4):
+            child = grid.neighbors[4 * cell + k]
+            if child >= 0 and not reached[child]:
+                reached[child] = 1
+                new = node_class(grid.cells[child], node, k, node.path_cost + 1)
+                new.f = new.path_cost
+                nodes.append(new)
+    return nodes
+
+
+def _node_tree_rss(kind, size):
+    """Subprocess side of node_memory: print the node count and the peak RSS
+    growth caused by the search tree."""
+    size = int(size)
+    grid = compile_maze(generate_maze(size, size, wall_density=0.1, seed=0))
+    before = peak_rss_kb()
+    nodes = build_search_tree(Node if kind == 'slots' else DictNode, grid)
+    print(len(nodes), peak_rss_kb() - before)
+
+
+def node_memory(size=1000):
+    """Compare the peak RSS of a search tree over a generated size x size maze
+    made of slotted Nodes with the same tree made of DictNodes. Each tree is
+    built in its own process so that the peaks do not mix."""
+    size = int(size)
+    print('Search tree over a generated %dx%d maze' % (size, size))
+    for kind, label in (('dict', 'Node with __dict__'), ('slots', 'Node with __slots__')):
+        out = subprocess.run([sys.executable, __file__, '_node_tree_rss', kind, str(size)],
+                             capture_output=True, text=True, check=True).stdout
+        count, kb = map(int, out.split())
+        print('%-20s %9d nodes  peak RSS +%7.1f MB  (%d bytes/node)'
+              % (label, count, kb / 1024, kb * 1024 // max(count, 1)))
+
+
+# ______________________________________________________________________________
+# Search benchmarks
+
+MAZE_NAMES = {0: 'maze30x30', 1: 'maze6x6', 2: 'maze8x8', 3: 'maze10x10', 4: 'maze_25x25'}
+
+
+def benchmark_mazes(sizes=(100, 200)):
+    """The default mazes (without their terrains) plus generated ones, as
+    (name, maze) pairs."""
+    named = [(name, mazes[i]) for i, name in MAZE_NAMES.items()]
+    for size in sizes:
+        named.append(('generated%d' % size, generate_maze(size, size, wall_density=0.3, seed=size)))
+    return named
+
+
+def grid_problem(maze, problem_class=CompiledDiamondExplorerProblem):
+    """A headless search problem from the agent of maze to its diamonds."""
+    env = DiamondMazeEnvironment(maze, lambda e: Agent(lambda percept: Action.NoOp))
+    return problem_class(env, observer=NullObserver())
+
+
+def solve(search, maze):
+    """Run search on a fresh problem; return (cost, expansions, seconds)."""
+    problem = grid_problem(maze)
+    start = time.perf_counter()
+    node = search(problem)
+    seconds = time.perf_counter() - start
+    return (node.path_cost if node else None), problem._expanded, seconds
+
+
+def landmarks(k=8):
+    """Compare A* expansions with the Manhattan and the landmark (ALT)
+    heuristics, and the time to compute vs. to load the landmark tables."""
+    k = int(k)
+    print('%-14s %6s %12s %12s %10s %10s' % ('maze', 'cost', 'manhattan', 'landmarks', 'compute', 'load'))
+    for name, maze in benchmark_mazes():
+        grid = compile_maze(maze)
+        start = time.perf_counter()
+        Landmarks(grid, k)
+        compute = time.perf_counter() - start
+        grid.landmarks(k)  # saved on the first run
+        grid.landmark_tables.clear()
+        start = time.perf_counter()
+        grid.landmarks(k)
+        load = time.perf_counter() - start
+        cost, manhattan, _ = solve(lambda p: arrayAStarSearch(p, manhattanHeuristic), maze)
+        cost2, alt, _ = solve(lambda p: arrayAStarSearch(p, landmarkHeuristic), maze)
+        assert cost == cost2, 'the landmark heuristic must not change the optimal cost'
+        print('%-14s %6s %12d %12d %9.3fs %9.3fs' % (name, cost, manhattan, alt, compute, load))
+
+
+def queues():
+    """Compare uniform cost search and A* (Manhattan heuristic) with a heap
+    and with a bucket queue frontier: expansions and seconds."""
+    searches = [('ucs', lambda p, queue: uniformCostSearch(p, queue)),
+                ('a*', lambda p, queue: aStarSearch(p, manhattanHeuristic, queue))]
+    print('%-14s %-4s %6s %10s %9s %10s %9s' % ('maze', '', 'cost', 'heap', '', 'bucket', ''))
+    for name, maze in benchmark_mazes():
+        for label, search in searches:
+            cost, heap, heap_time = solve(lambda p: search(p, 'heap'), maze)
+            cost2, bucket, bucket_time = solve(lambda p: search(p, 'bucket'), maze)
+            assert cost == cost2, 'the queue must not change the optimal cost'
+            print('%-14s %-4s %6s %10d %8.3fs %10d %8.3fs'
+                  % (name, label, cost, heap, heap_time, bucket, bucket_time))
+
+
+def bidirectional(size=300):
+    """Compare the expansions of the bidirectional searches with uniform cost
+    search and A* (Manhattan heuristic), on the default and generated mazes
+    and on an open size x size grid."""
+    size = int(size)
+    named = benchmark_mazes() + [('open%d' % size, generate_maze(size, size, wall_density=0, seed=size))]
+    searches = [('ucs', uniformCostSearch),
+                ('bi_bfs', bidirectionalBreadthFirstSearch),
+                ('a*', lambda p: aStarSearch(p, manhattanHeuristic)),
+                ('bi_a*', bidirectionalAStarSearch)]
+    print('%-14s %6s' % ('maze', 'cost') + ''.join('%10s' % label for label, _ in searches))
+    for name, maze in named:
+        results = [solve(search, maze) for _, search in searches]
+        assert len({cost for cost, _, _ in results}) == 1, 'the searches must agree on the optimal cost'
+        print('%-14s %6s' % (name, results[0][0]) + ''.join('%10d' % expanded for _, expanded, _ in results))
+
+
+def batch_heuristics(nb_diamonds=500, size=200):
+    """Compare A* (with a Node per state, and array-backed) using the
+    Manhattan heuristic one node at a time and batched with NumPy, on a
+    generated maze with many diamonds."""
+    nb_diamonds, size = int(nb_diamonds), int(size)
+    rows = [list(row) for row in generate_maze(size, size, wall_density=0.3, nb_diamonds=0, seed=size)]
+    rnd = random.Random(size)
+    far = [(x, y) for y in range(size // 2, size - 1) for x in range(size // 2, size - 1) if rows[y][x] == ' ']
+    for x, y in rnd.sample(far, nb_diamonds):
+        rows[y][x] = '*'
+    maze = [''.join(row) for row in rows]
+    print('Generated %dx%d maze with %d diamonds in its far quarter' % (size, size, nb_diamonds))
+    print('%-10s %6s %10s %12s %10s' % ('search', 'cost', 'expanded', 'manhattan', 'batched'))
+    for label, search in (('a*', aStarSearch), ('array a*', arrayAStarSearch)):
+        cost, expanded, scalar_time = solve(lambda p: search(p, manhattanHeuristic), maze)
+        cost2, _, batch_time = solve(lambda p: search(p, batchManhattanHeuristic), maze)
+        assert cost == cost2, 'batching must not change the optimal cost'
+        print('%-10s %6s %10d %11.3fs %9.3fs' % (label, cost, expanded, scalar_time, batch_time))
+
+
+def batch(nb_queries=1000, workers=None):
+    """Throughput of solve_batch (A*, Manhattan heuristic) on queries from
+    random free cells to the diamonds of generated mazes, with a single
+    worker process and with workers (one per CPU by default)."""
+    nb_queries = int(nb_queries)
+    workers = int(workers) if workers else os.cpu_count()
+    rnd = random.Random(0)
+    layouts = [generate_maze(size, size, wall_density=0.2, nb_diamonds=3, seed=size) for size in (30, 60, 100)]
+    free = [[(x, y) for y, row in enumerate(maze) for x, ch in enumerate(row) if ch == ' ']
+            for maze in layouts]
+    jobs = [BatchJob(layouts[i % len(layouts)], 'a_star', 'manhattanHeuristic', rnd.choice(free[i % len(layouts)]))
+            for i in range(nb_queries)]
+    print('%d queries on %d generated mazes' % (nb_queries, len(layouts)))
+    for n in sorted({1, workers}):
+        start = time.perf_counter()
+        results = list(solve_batch(jobs, workers=n))
+        seconds = time.perf_counter() - start
+        solved = sum(1 for result in results if result.cost is not None)
+        print('%2d worker(s): %7.2fs  %8.0f queries/min  (%d solved)'
+              % (n, seconds, 60 * nb_queries / seconds, solved))
+
+
+BENCHMARKS = {'node_memory': node_memory,
+              'landmarks': landmarks,
+              'queues': queues,
+              'bidirectional': bidirectional,
+              'batch_heuristics': batch_heuristics,
+              'batch': batch,
+              '_node_tree_rss': _node_tree_rss}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print('usage: python benchmarks.py {%s} [args...]'
+              % '|'.join(name for name in BENCHMARKS if not name.startswith('_')))
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
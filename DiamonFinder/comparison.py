@@ -1,88 +1,173 @@
+import csv
+import json
+import queue
+from statistics import mean
 from tkinter import CENTER
 from tkinter.font import Font
 
-import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from PIL import Image, ImageTk
 
+from agents import AgentRuns, EnvironmentTemplate
 from diamond_2d_gui import *
 
-global result_image
+
+# How often (in ms) the Tk side looks for the progress of the comparison runs
+POLL_INTERVAL = 50
+
+
+def maze_template(maze):
+    """An EnvironmentTemplate of maze without its agent, whose agents are
+    added where the 'A' of the layout is."""
+    location = None
+    for y, row in enumerate(maze):
+        if 'A' in row:
+            location = (row.index('A'), y)
+    env = build_diamond_explorer_environment([row.replace('A', ' ') for row in maze], None)
+    return EnvironmentTemplate(env, location)
 
 
 class Comparison:
-    def __init__(self, canvas, interrupted, done_observer, nb_run=10):
+    """Runs nb_run simulations of each agent factory on each maze, with
+    AgentRuns (worker processes, or a thread where processes cannot be
+    forked), and plots the mean performances. Each finished run is put on
+    the progress queue; the Tk side polls it every POLL_INTERVAL ms to
+    advance the progress bar and show the partial means, so the window never
+    freezes. Setting interrupted cancels the runs that are queued or in
+    progress."""
+
+    def __init__(self, canvas, interrupted, done_observer, nb_run=10, workers=None, steps=1000, seed=0):
         self.agent_factories = [ ]
+        self.agent_labels = ['random_agent', 'reflex_agent', 'model_based_agent', 'model_based_advanced']
         self.mazes2d = [maze30x30, maze6x6, maze8x8, maze10x10]
+        self.maze_labels = ['maze30x30', 'maze6x6', 'maze8x8', 'maze10x10', 'maze25x25']
         self.results = [[] for i in range(len(self.agent_factories))]
-        self.a = 0
-        self.m = 0
+        self.result_image = None
         self.canvas = canvas
         self.nb_run = nb_run
+        self.workers = workers
+        self.steps = steps
+        self.seed = seed
         self.interrupted = interrupted
         self.done_observer = done_observer
-        full_ex = len(self.agent_factories)*len(self.mazes2d)
+        self.progress = queue.Queue()
+        self.runs = None
+        self.finished = 0
+        full_ex = len(self.agent_factories)*len(self.mazes2d)*self.nb_run
         self.circularProgressbar = CircularProgressbar(canvas, 0, 0,
                                                        canvas.winfo_width(),
                                                        canvas.winfo_height(),
                                                        20,
-                                                       full_extent=full_ex)
+                                                       full_extent=max(full_ex, 1))
 
     def run(self):
         self.circularProgressbar.start()
-        self.next_test()
-
-    def next_test(self):
-        if self.m >= 4:
-            self.m = 0
-            self.a += 1
-        if self.a < len(self.agent_factories) and not self.interrupted.get():
-            agent_factory = self.agent_factories[self.a]
-            performances = 0.0
-            for i in range(self.nb_run):
-                env = build_diamond_explorer_environment(self.mazes2d[self.m], agent_factory)
-                env.run()
-                performances += env.agents[0].performance
-            self.results[self.a].append(performances / self.nb_run)
-            self.m += 1
-            self.circularProgressbar.step()
-            self.canvas.after(self.nb_run, self.next_test)
-        else:
-            if not self.interrupted.get():
-                self.plot()
-                self.draw_result()
+        nb_mazes = len(self.mazes2d)
+        self.sums = [[0.0] * nb_mazes for a in self.agent_factories]
+        self.counts = [[0] * nb_mazes for a in self.agent_factories]
+        # the i-th template is run i % nb_run of maze i // nb_run
+        templates = [template for template in map(maze_template, self.mazes2d) for i in range(self.nb_run)]
+        self.runs = AgentRuns(self.agent_factories, templates, self.steps, self.workers, self.seed)
+        self.runs.start(self.report)
+        self.canvas.after(POLL_INTERVAL, self.poll)
+
+    def report(self, a, i, future):
+        """Called in a thread of AgentRuns when a run is over."""
+        self.progress.put((a, i // self.nb_run, future))
+
+    def poll(self):
+        """Take the finished runs off the progress queue (without waiting),
+        and finish or cancel the comparison."""
+        if self.interrupted.get():
+            self.cancel()
             self.done_observer()
+            return
+        while True:
+            try:
+                a, m, future = self.progress.get_nowait()
+            except queue.Empty:
+                break
+            if future.exception() is not None:
+                self.cancel()
+                self.done_observer()
+                raise future.exception()
+            performance = future.result()
+            if performance is None:
+                continue
+            self.sums[a][m] += performance
+            self.counts[a][m] += 1
+            self.finished += 1
+            self.circularProgressbar.step()
+            self.circularProgressbar.show_status('agent %d, maze %d: %d/%d runs, mean %.1f'
+                                                 % (a + 1, m + 1, self.counts[a][m], self.nb_run,
+                                                    self.sums[a][m] / self.counts[a][m]))
+        if self.finished < len(self.runs.futures):
+            self.canvas.after(POLL_INTERVAL, self.poll)
+            return
+        n = self.nb_run
+        self.results = [[mean(scores[m * n:(m + 1) * n]) for m in range(len(self.mazes2d))]
+                        for scores in self.runs.scores()]
+        self.draw_result()
+        self.done_observer()
+
+    def cancel(self):
+        """Drop the queued runs and stop the ones in progress at their next step."""
+        if self.runs is not None:
+            self.runs.cancel()
 
-    def plot(self):
-        # Turn interactive plotting off
-        plt.ioff()
-        # Create a new figure, plot into it, then close it so it never gets displayed
-        fig = plt.figure()
-        agent_lab = ['random_agent', 'reflex_agent', 'model_based_agent', 'model_based_advanced']
-        maze_lab = ['maze30x30', 'maze6x6', 'maze8x8', 'maze10x10', 'maze25x25']
+    def plot(self, size=(640, 480), dpi=100):
+        """Render the chart of the results into an RGBA array of size pixels
+        (width, height), on an Agg canvas: no window and no file."""
+        fig = Figure(figsize=(size[0] / dpi, size[1] / dpi), dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        positions = range(1, 1 + len(self.mazes2d))
         for i in range(len(self.agent_factories)):
-            plt.scatter([1, 2, 3, 4], self.results[i], label=agent_lab[i])
+            ax.scatter(positions[:len(self.results[i])], self.results[i], label=self.agent_label(i))
         # Add a legend
-        plt.legend()
-        plt.xticks(range(1, 1 + len(maze_lab)), maze_lab, size='small')
-        plt.savefig('images/compare-result.png')
-        plt.close(fig)
+        if self.agent_factories:
+            ax.legend()
+        ax.set_xticks(positions)
+        ax.set_xticklabels(self.maze_labels[:len(self.mazes2d)], size='small')
+        fig.canvas.draw()
+        return np.asarray(fig.canvas.buffer_rgba())
 
     def draw_result(self):
         self.canvas.delete('all')
-        image = Image.open('images/compare-result.png')
         min1 = min(int(self.canvas.winfo_width()-5),  int(self.canvas.winfo_height()-5))
-        size=(min1, min1)
-        if image.size[0] > image.size[1]:
-            ratio = float(min1)/image.size[0]
-            size=(min1, int(ratio*image.size[1]))
-        else:
-            ratio = float(min1)/image.size[1]
-            size=(int(ratio*image.size[0]), min1 )
+        # the chart keeps the 4:3 shape of a default matplotlib figure
+        size = (min1, int(0.75 * min1))
+        image = Image.fromarray(self.plot(size), 'RGBA')
+        self.result_image = ImageTk.PhotoImage(image)  # the canvas does not keep a reference
+        self.canvas.create_image(size[0]/2, size[1]/2, image=self.result_image, anchor=CENTER)
+
+    def agent_label(self, a):
+        if a < len(self.agent_labels):
+            return self.agent_labels[a]
+        return 'agent %d' % (a + 1)
 
-        image = image.resize(size)
-        global result_image
-        result_image = ImageTk.PhotoImage(image)
-        self.canvas.create_image(size[0]/2, size[1]/2, image=result_image, anchor=CENTER)
+    def result_rows(self):
+        """The results as (agent, maze, mean performance) rows."""
+        return [(self.agent_label(a), self.maze_labels[m], performance)
+                for a, performances in enumerate(self.results)
+                for m, performance in enumerate(performances)]
+
+    def export_csv(self, path):
+        """Write the mean performance of each agent on each maze to a CSV file."""
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(('agent', 'maze', 'performance'))
+            writer.writerows(self.result_rows())
+
+    def export_json(self, path):
+        """Write the results to a JSON file, with the number of runs behind each mean."""
+        with open(path, 'w') as file:
+            json.dump({'nb_run': self.nb_run,
+                       'results': [{'agent': agent, 'maze': maze, 'performance': performance}
+                                   for agent, maze, performance in self.result_rows()]},
+                      file, indent=2)
 
 
 class CircularProgressbar(object):
@@ -100,6 +185,7 @@ class CircularProgressbar(object):
         self.oval_id2 = self.canvas.create_oval(self.x0 + w2, self.y0 + w2,
                                                 self.x1 - w2, self.y1 - w2)
         self.running = False
+        self.status_id = None
         self.cur_extent = 0
         self.increment = 360 / full_extent  # 30
 
@@ -114,3 +200,10 @@ class CircularProgressbar(object):
         self.canvas.itemconfigure(self.arc_id, extent=self.cur_extent)
         percent = '{:.0f}%'.format(round(float((self.cur_extent / self.increment) * 100 / self.full_extent)))
         self.canvas.itemconfigure(self.label_id, text=percent)
+
+    def show_status(self, text):
+        """Show text (e.g. the partial results) under the percentage."""
+        if self.status_id is None:
+            self.status_id = self.canvas.create_text(self.tx, self.ty + 30, text=text)
+        else:
+            self.canvas.itemconfigure(self.status_id, text=text)
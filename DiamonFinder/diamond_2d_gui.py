@@ -1,10 +1,10 @@
 # =======Default mazes=======
-import copy
 from tkinter import CENTER
 
 from PIL import Image, ImageTk
 
-from agents import Thing, XYEnvironment, Wall, Action
+from agents import Thing, XYEnvironment, Wall, Action, Agent
+from grid import compile_costs, compile_maze
 from search import SearchAgent
 
 maze30x30 = ["##############################",
@@ -99,8 +99,23 @@ maze_25x25 = [
     "#*                      #",
     "#########################"
 ]
+# Terrains give the cost of moving into each cell of a maze ('1'-'9', any
+# other character costs 1), see grid.compile_costs
+terrain10x10 = ["            ",
+                "            ",
+                "     555    ",
+                "     555    ",
+                " 33     9   ",
+                " 33         ",
+                " 33         ",
+                " 55         ",
+                " 55         ",
+                "            ",
+                "            ",
+                "            "]
 # =======End default mazes=======
-mazes = {0: maze30x30, 1: maze6x6, 2: maze8x8, 3: maze10x10, 4: maze_25x25}
+mazes = {0: maze30x30, 1: maze6x6, 2: maze8x8, 3: maze10x10, 4: maze_25x25, 5: maze10x10}
+terrains = {5: terrain10x10}
 
 
 class Diamond(Thing):
@@ -110,10 +125,54 @@ class Diamond(Thing):
 # ____________________Complex Environment ___________________________________`
 
 class DiamondExplorerEnvironment(XYEnvironment):
+    """The environment keeps a registry of its diamonds, walls and agents:
+    for each of these classes, the locations of its things (with their
+    multiplicity), updated whenever a thing is added, deleted or moved.
+    Counting them or listing their locations does not scan the world.
+    costs[x + y * width] is the cost of moving into (x, y) (1 everywhere
+    unless a terrain is given, see DiamondMazeEnvironment)."""
+
+    registered_classes = (Diamond, Wall, Agent)
+
     def __init__(self, width=10, height=10):
         super().__init__(width, height)
+        self.registries = {cls: {} for cls in self.registered_classes}  # class -> {location: count}
+        self.counts = dict.fromkeys(self.registered_classes, 0)
+        self.costs = compile_costs(None, width, height)
         self.add_walls()
 
+    def index_thing(self, thing):
+        super().index_thing(thing)
+        location = self.indexed_location[thing]
+        for cls, registry in self.registries.items():
+            if isinstance(thing, cls):
+                registry[location] = registry.get(location, 0) + 1
+                self.counts[cls] += 1
+
+    def unindex_thing(self, thing):
+        location = self.indexed_location.get(thing)
+        super().unindex_thing(thing)
+        if location is None:
+            return
+        for cls, registry in self.registries.items():
+            if isinstance(thing, cls):
+                if registry[location] == 1:
+                    del registry[location]
+                else:
+                    registry[location] -= 1
+                self.counts[cls] -= 1
+
+    def count(self, cls):
+        """Return the number of registered things of class cls (Diamond, Wall or Agent)."""
+        return self.counts[cls]
+
+    def locations(self, cls):
+        """Return a (live) view of the locations of the things of class cls."""
+        return self.registries[cls].keys()
+
+    def has_diamonds(self):
+        return bool(self.registries[Diamond])
+
     def thing_classes(self):
         return [Wall, Diamond, SearchAgent]
 
@@ -137,14 +196,57 @@ class DiamondExplorerEnvironment(XYEnvironment):
             if agent.bump:
                 agent.performance -= 5
             elif action != Action.NoOp:
-                agent.performance -= 10
+                x, y = agent.location
+                agent.performance -= 10 * self.costs[x + y * self.width]
 
     def get_diamond_location(self):
-        locations = []
-        for thing in self.things:
-            if isinstance(thing, Diamond):
-                locations.append(thing.location)
-        return locations
+        return list(self.registries[Diamond])
+
+
+class DiamondMazeEnvironment(DiamondExplorerEnvironment):
+    """A DiamondExplorerEnvironment built from a maze layout (a list of strings
+    where '#' is a wall, '*' a diamond and 'A' the agent). It needs no GUI,
+    so it can run SearchAgents headless, e.g. with a NullObserver.
+    agent_factory is called with the environment and returns the agent.
+    terrain gives the cost of moving into each cell (see grid.compile_costs)."""
+
+    def __init__(self, maze, agent_factory=None, terrain=None):
+        super().__init__(len(maze[0]), len(maze))
+        self.maze = list(maze)
+        self.terrain = terrain
+        self.costs = compile_costs(terrain, self.width, self.height)
+        self.agent = None
+        self.goal_distance_field = None
+        for i in range(1, len(self.maze) - 1):
+            for j in range(1, len(self.maze[i])):
+                if self.maze[i][j] == '#':
+                    self.add_thing(Wall(), (j, i))
+                elif self.maze[i][j] == '*':
+                    self.add_thing(Diamond(), (j, i))
+                elif self.maze[i][j] == 'A' and agent_factory is not None:
+                    self.agent = agent_factory(self)
+                    self.add_thing(self.agent, (j, i))
+
+    def delete_thing(self, thing):
+        super().delete_thing(thing)
+        if isinstance(thing, Diamond):
+            x, y = thing.location
+            self.maze[y] = self.maze[y][:x] + ' ' + self.maze[y][x + 1:]
+            self.goal_distance_field = None
+
+    def goal_distances(self):
+        """Return the DistanceField of the remaining diamonds. It is shared by
+        all the searches of an episode until a diamond is removed (fields are
+        also cached per maze and diamond set by the compiled grid)."""
+        if self.goal_distance_field is None:
+            self.goal_distance_field = compile_maze(self.maze).distance_field(self.get_diamond_location())
+        return self.goal_distance_field
+
+    def is_wall(self, x, y):
+        return self.maze[y][x] == '#'
+
+    def is_diamond(self, x, y):
+        return self.maze[y][x] == '*'
 
 
 def build_diamond_explorer_environment(maze, agent_factory):
@@ -164,25 +266,16 @@ global current_robot_img
 global current_diamond_photo
 
 
-class DiamondExplorerEnv4Gui(DiamondExplorerEnvironment):
+class DiamondExplorerEnv4Gui(DiamondMazeEnvironment):
     def __init__(self, canvas, animation_speed,
                  interrupted,
                  score_lbl,
                  maze_index, done_observer,
                  fn='dfs', prob='DiamondExplorerProblem',
                  heuristic='nullHeuristic'):
-        super().__init__(len(mazes.get(maze_index)[0]), len(mazes.get(maze_index)))
-        self.maze = copy.deepcopy(mazes.get(maze_index))
-        for i in range(1, len(self.maze) - 1):
-            for j in range(1, len(self.maze[i])):
-                if self.maze[i][j] == '#':
-                    self.add_thing(Wall(), (j, i))
-                elif self.maze[i][j] == '*':
-                    self.add_thing(Diamond(), (j, i))
-                elif self.maze[i][j] == 'A':
-                    self.agent = SearchAgent(self, fn, prob, heuristic)
-                    self.add_thing(self.agent, (j, i))
-
+        super().__init__(mazes.get(maze_index),
+                         lambda env: SearchAgent(env, fn, prob, heuristic),
+                         terrains.get(maze_index))
         self.canvas = canvas
         self.speed = animation_speed
         self.score_lbl = score_lbl
@@ -193,12 +286,16 @@ class DiamondExplorerEnv4Gui(DiamondExplorerEnvironment):
         self.robot_img = None
         self.diamond_img = Image.open("images/diamond.png")
         self.diamond_photo = None
-
-    def delete_thing(self, thing):
-        super().delete_thing(thing)
-        if isinstance(thing, Diamond):
-            x, y = thing.location
-            self.maze[y] = self.maze[y][:x] + ' ' + self.maze[y][x + 1:]
+        # the canvas items, created once by build_canvas
+        self.canvas_size = None
+        self.background_item = None
+        self.cell_items = None  # cell id -> rectangle item
+        self.cell_colors = None  # cell id -> color of its rectangle
+        self.diamond_items = {}  # (x, y) -> image item
+        self.agent_item = None
+        self.path_solution = None  # the path drawn, and its states
+        self.path = frozenset()
+        self.dirty = set()  # cell ids that may have to be re-colored
 
     def run(self, steps=1000):
         """Run the Environment for given number of time steps."""
@@ -226,31 +323,77 @@ class DiamondExplorerEnv4Gui(DiamondExplorerEnvironment):
             self.done_observer()
 
     def draw_maze(self):
+        """Bring the canvas up to date with the environment. The items of the
+        cells are created once (see build_canvas); then only the cells that
+        changed are re-colored: the ones colored by the search (see draw_rec),
+        the diamonds grabbed and the cells of the old and new solution paths.
+        The agent image is moved."""
+        size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        if (self.cell_items is None or size != self.canvas_size
+                or not self.canvas.type(self.background_item)):
+            self.build_canvas(size)
+            return
+        dirty = self.dirty
+        if self.agent.path_solution is not self.path_solution:
+            path = self.solution_path()
+            dirty.update(self.cell_id(state) for state in self.path.symmetric_difference(path))
+            self.path = path
+        for location in [location for location in self.diamond_items if not self.is_diamond(*location)]:
+            self.canvas.delete(self.diamond_items.pop(location))
+            dirty.add(self.cell_id(location))
+        for cell in dirty:
+            self.recolor(cell, self.cell_color(cell % self.width, cell // self.width))
+        dirty.clear()
+        self.draw_agent()
+
+    def build_canvas(self, size):
+        """Draw the whole maze, creating the items that draw_maze updates."""
         self.canvas.delete('all')
-        height = self.canvas.winfo_height()
-        width = self.canvas.winfo_width()
-        self.canvas.create_rectangle(0, 0, width, height, fill="white")
-        path = []
-        if self.agent.path_solution:
-            for node in self.agent.path_solution:
-                path.append(node.state)
+        self.canvas_size = size
+        self.background_item = self.canvas.create_rectangle(0, 0, size[0], size[1], fill="white")
+        self.path = self.solution_path()
+        self.cell_items = [None] * (self.width * self.height)
+        self.cell_colors = [None] * (self.width * self.height)
+        self.diamond_items = {}
+        self.agent_item = None
+        self.dirty.clear()
         for y, row in enumerate(self.maze):
             for x, ch in enumerate(row):
-                if self.is_wall(x, y):
-                    self.draw_wall(x, y)
-                elif self.is_diamond(x, y):
-                    self.draw_diamond(x, y)
-                elif (x, y) in path:
-                    self.draw_rec(x, y, color="cyan")
-                else:
-                    self.draw_rec(x, y, "white")
+                color = self.cell_color(x, y)
+                x1, y1, x2, y2 = self.convert(x, y)
+                cell = self.cell_id((x, y))
+                self.cell_items[cell] = self.canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline="black")
+                self.cell_colors[cell] = color
+        for y, row in enumerate(self.maze):
+            for x, ch in enumerate(row):
+                if self.is_diamond(x, y):
+                    self.diamond_items[(x, y)] = self.draw_diamond(x, y)
         self.draw_agent()
 
-    def is_wall(self, x, y):
-        return self.maze[y][x] == '#'
-
-    def is_diamond(self, x, y):
-        return self.maze[y][x] == '*'
+    def solution_path(self):
+        """The set of the states of the solution path of the agent."""
+        self.path_solution = self.agent.path_solution
+        if not self.path_solution:
+            return frozenset()
+        return frozenset(node.state for node in self.path_solution)
+
+    def cell_id(self, location):
+        x, y = location
+        return x + y * self.width
+
+    def cell_color(self, x, y):
+        if self.is_wall(x, y):
+            return "#000"
+        elif self.is_diamond(x, y):
+            return "white"
+        elif (x, y) in self.path:
+            return "cyan"
+        return "white"
+
+    def recolor(self, cell, color):
+        if self.cell_colors[cell] != color:
+            self.canvas.itemconfigure(self.cell_items[cell], fill=color)
+            self.cell_colors[cell] = color
 
     def draw_wall(self, x, y):
         self.draw_rec(x, y, "#000")
@@ -272,12 +415,20 @@ class DiamondExplorerEnv4Gui(DiamondExplorerEnvironment):
 
         global current_diamond_photo
         current_diamond_photo = self.get_diamond_photo()
-        self.canvas.create_image((x1 + x2) / 2,
-                                 (y1 + y2) / 2,
-                                 image=current_diamond_photo,
-                                 anchor=CENTER)
+        return self.canvas.create_image((x1 + x2) / 2,
+                                        (y1 + y2) / 2,
+                                        image=current_diamond_photo,
+                                        anchor=CENTER)
 
     def draw_rec(self, x, y, color):
+        """Color the cell (x, y), e.g. to show the search. Once the maze is
+        drawn, the rectangle of the cell is re-colored, and draw_maze gives
+        it back its own color on the next tick."""
+        if self.cell_items is not None:
+            cell = self.cell_id((x, y))
+            self.recolor(cell, color)
+            self.dirty.add(cell)
+            return
         x1, y1, x2, y2 = self.convert(x, y)
         self.canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline=color)
         self.canvas.create_rectangle(x1, y1, x2, y2, outline="black")
@@ -310,10 +461,13 @@ class DiamondExplorerEnv4Gui(DiamondExplorerEnvironment):
 
         global current_robot_img
         current_robot_img = self.get_robot_img()
-        self.canvas.create_image((x1 + x2) / 2,
-                                 (y1 + y2) / 2,
-                                 image=current_robot_img,
-                                 anchor=CENTER)
+        if self.agent_item is None:
+            self.agent_item = self.canvas.create_image((x1 + x2) / 2,
+                                                       (y1 + y2) / 2,
+                                                       image=current_robot_img,
+                                                       anchor=CENTER)
+        else:
+            self.canvas.coords(self.agent_item, (x1 + x2) / 2, (y1 + y2) / 2)
 
     def get_robot_img(self):
         return self.robot_img
@@ -0,0 +1,517 @@
+"""
+ A maze layout compiled once into flat arrays, for fast grid searches
+"""
+# ______________________________________________________________________________
+# Cells are numbered row by row: the cell id of (x, y) is x + y * width.
+# The occupancy grid is a bytearray indexed by cell id (1 for a wall), and the
+# successor tables give, for each cell id, the moves that do not hit a wall.
+import functools
+import hashlib
+import heapq
+import os
+import random
+from array import array
+from collections import OrderedDict
+
+from agents import Action
+
+# Same order as the actions returned by DiamondExplorerProblem.actions
+MOVES = ((Action.LEFT, -1, 0), (Action.DOWN, 0, 1), (Action.RIGHT, 1, 0), (Action.UP, 0, -1))
+
+OPPOSITE_ACTIONS = {Action.LEFT: Action.RIGHT, Action.RIGHT: Action.LEFT,
+                    Action.UP: Action.DOWN, Action.DOWN: Action.UP}
+
+_WALLS_ONLY = str.maketrans({'*': ' ', 'A': ' '})
+
+UNREACHABLE = 2 ** 31 - 1
+
+# Where Landmarks tables are saved, one file per maze layout and number of landmarks
+LANDMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'landmarks')
+
+
+class MazeGrid:
+    """The walls of a maze (a list of strings where '#' is a wall) compiled
+    into an occupancy bytearray and precomputed successor tables.
+        walls[c]      1 if cell c is a wall, 0 otherwise
+        cells[c]      the (x, y) state of cell c (the same tuple every time)
+        neighbors     flat array('i') with 4 slots per cell, in MOVES order,
+                      holding the neighbor cell id or -1 for a wall
+        actions[c]    tuple of the actions that are possible in cell c
+        moves[c]      dict action -> (x, y) state reached from cell c
+    Diamonds and the agent are not part of the grid: they move or disappear
+    during an episode, while the walls never do."""
+
+    def __init__(self, maze):
+        self.width = width = max(len(row) for row in maze)
+        # identifies the wall layout, e.g. to find tables saved for this maze
+        self.fingerprint = hashlib.sha1('\n'.join(row.translate(_WALLS_ONLY) for row in maze)
+                                        .encode()).hexdigest()
+        self.height = height = len(maze)
+        self.size = size = width * height
+        self.walls = bytearray(b'\x01') * size  # missing cells count as walls
+        for y, row in enumerate(maze):
+            for x, ch in enumerate(row):
+                if ch != '#':
+                    self.walls[x + y * width] = 0
+        self.cells = [(x, y) for y in range(height) for x in range(width)]
+        self.neighbors = array('i', [-1]) * (4 * size)
+        self.actions = [()] * size
+        self.moves = [None] * size
+        for c in range(size):
+            if self.walls[c]:
+                continue
+            x, y = self.cells[c]
+            actions, moves = [], {}
+            for k, (action, dx, dy) in enumerate(MOVES):
+                x2, y2 = x + dx, y + dy
+                if 0 <= x2 < width and 0 <= y2 < height and not self.walls[x2 + y2 * width]:
+                    c2 = x2 + y2 * width
+                    self.neighbors[4 * c + k] = c2
+                    actions.append(action)
+                    moves[action] = self.cells[c2]
+            self.actions[c] = tuple(actions)
+            self.moves[c] = moves
+        self.distance_fields = OrderedDict()  # frozenset of goals -> DistanceField
+        self.landmark_tables = {}  # number of landmarks -> Landmarks
+        self.cluster_abstractions = {}  # (cluster size, costs) -> ClusterAbstraction
+
+    max_distance_fields = 8
+
+    def distance_field(self, goals):
+        """Return the DistanceField of goals on this grid, computing it only
+        the first time this goal set is asked for (the last
+        max_distance_fields goal sets are kept)."""
+        goals = frozenset(goals)
+        field = self.distance_fields.get(goals)
+        if field is None:
+            field = self.distance_fields[goals] = DistanceField(self, goals)
+            if len(self.distance_fields) > self.max_distance_fields:
+                self.distance_fields.popitem(last=False)
+        else:
+            self.distance_fields.move_to_end(goals)
+        return field
+
+    def landmarks(self, k=8, directory=LANDMARKS_DIR):
+        """Return the Landmarks of this grid with k landmarks, loading them from
+        directory if they were saved by a previous run, otherwise computing
+        and saving them there."""
+        table = self.landmark_tables.get(k)
+        if table is None:
+            path = os.path.join(directory, '%s-%d.bin' % (self.fingerprint, k))
+            table = Landmarks.load(self, path)
+            if table is None:
+                table = Landmarks(self, k)
+                table.save(path)
+            self.landmark_tables[k] = table
+        return table
+
+    def cluster_abstraction(self, cluster_size=10, costs=None):
+        """Return the ClusterAbstraction of this grid with the move costs
+        (see compile_costs; None when every move costs 1). When another
+        layout or terrain of the same size was abstracted recently (e.g. the
+        maze before a wall was added), only the clusters touched by the
+        differences are rebuilt."""
+        abstraction = self.cluster_abstractions.get((cluster_size, costs))
+        if abstraction is None:
+            key = (self.width, self.height, cluster_size)
+            previous = _latest_abstractions.get(key)
+            if previous is None:
+                abstraction = ClusterAbstraction(self, cluster_size, costs)
+            else:
+                abstraction = previous.updated(self, costs)
+            self.cluster_abstractions[(cluster_size, costs)] = _latest_abstractions[key] = abstraction
+            _latest_abstractions.move_to_end(key)
+            if len(_latest_abstractions) > MAX_LATEST_ABSTRACTIONS:
+                _latest_abstractions.popitem(last=False)
+        return abstraction
+
+    def cell_id(self, state):
+        """Return the cell id of an (x, y) state."""
+        x, y = state
+        return x + y * self.width
+
+    def state(self, cell):
+        """Return the (x, y) state of a cell id."""
+        return self.cells[cell]
+
+    def is_wall(self, x, y):
+        return self.walls[x + y * self.width] == 1
+
+
+class DistanceField:
+    """The distance from every cell of a MazeGrid to the nearest of a set of
+    goal states, computed once by a breadth-first search from all the goals
+    at the same time. distances[c] is UNREACHABLE for cells that cannot reach
+    a goal. It is an exact heuristic, and following it downhill walks a
+    shortest path without any search."""
+
+    def __init__(self, grid, goals):
+        self.grid = grid
+        self.width = grid.width
+        self.goals = frozenset(goals)
+        self.distances = distances = array('i', [UNREACHABLE]) * grid.size
+        neighbors = grid.neighbors
+        layer = []
+        for x, y in self.goals:
+            c = x + y * grid.width
+            if not grid.walls[c] and distances[c] != 0:
+                distances[c] = 0
+                layer.append(c)
+        d = 0
+        while layer:
+            d += 1
+            next_layer = []
+            for c in layer:
+                for k in range(4 * c, 4 * c + 4):
+                    c2 = neighbors[k]
+                    if c2 >= 0 and distances[c2] == UNREACHABLE:
+                        distances[c2] = d
+                        next_layer.append(c2)
+            layer = next_layer
+
+    def distance(self, state):
+        x, y = state
+        return self.distances[x + y * self.width]
+
+    def descent(self, state):
+        """Return the (action, state) moves of a shortest path from state to
+        the nearest goal, or None if no goal can be reached from state."""
+        distances, neighbors, cells = self.distances, self.grid.neighbors, self.grid.cells
+        c = state[0] + state[1] * self.width
+        d = distances[c]
+        if d == UNREACHABLE:
+            return None
+        moves = []
+        while d > 0:
+            for k in range(4):
+                c2 = neighbors[4 * c + k]
+                if c2 >= 0 and distances[c2] == d - 1:
+                    break
+            moves.append((MOVES[k][0], cells[c2]))
+            c, d = c2, d - 1
+        return moves
+
+
+class Landmarks:
+    """Exact distances from k landmark cells to every cell of a MazeGrid,
+    for the ALT (A*, Landmarks, Triangle inequality) heuristic: since moves
+    are reversible, |d(L, n) - d(L, g)| <= d(n, g) for every landmark L.
+    The landmarks are spread by farthest-point selection: each new landmark
+    is the cell farthest from the ones already chosen."""
+
+    def __init__(self, grid, k=8, cells=None, tables=None):
+        self.grid = grid
+        if cells is not None:
+            self.cells, self.tables = cells, tables
+            return
+        self.cells, self.tables = [], []
+        free = [c for c in range(grid.size) if not grid.walls[c]]
+        if not free:
+            return
+        # the first landmark is the cell farthest from an arbitrary free cell
+        nearest = DistanceField(grid, [grid.cells[free[0]]]).distances
+        for i in range(min(k, len(free))):
+            landmark = max(free, key=lambda c: nearest[c] if nearest[c] != UNREACHABLE else -1)
+            if i and nearest[landmark] == 0:
+                break  # every free cell is a landmark already
+            distances = DistanceField(grid, [grid.cells[landmark]]).distances
+            self.cells.append(landmark)
+            self.tables.append(distances)
+            nearest = distances if i == 0 else array('i', map(min, nearest, distances))
+
+    def vector(self, state):
+        """The distances from every landmark to state."""
+        c = state[0] + state[1] * self.grid.width
+        return tuple(table[c] for table in self.tables)
+
+    def save(self, path):
+        """Save the tables to path (failing silently: they can be recomputed)."""
+        header = array('i', [len(self.cells), self.grid.size] + self.cells)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                header.tofile(f)
+                for table in self.tables:
+                    table.tofile(f)
+        except OSError:
+            pass
+
+    @classmethod
+    def load(cls, grid, path):
+        """Return the Landmarks saved at path for grid, or None."""
+        try:
+            with open(path, 'rb') as f:
+                header = array('i')
+                header.fromfile(f, 2)
+                k, size = header
+                if size != grid.size:
+                    return None
+                cells = array('i')
+                cells.fromfile(f, k)
+                tables = []
+                for i in range(k):
+                    table = array('i')
+                    table.fromfile(f, size)
+                    tables.append(table)
+        except (OSError, EOFError):
+            return None
+        return cls(grid, k, list(cells), tables)
+
+
+class ClusterAbstraction:
+    """The abstract graph of HPA* (hierarchical path-finding A*) over a
+    MazeGrid cut into clusters of cluster_size x cluster_size cells.
+    Along each border between two adjacent clusters, every run of cells that
+    are free on both sides is an entrance, crossed at its middle (or at both
+    ends for runs of 6 cells or more). The cells on both sides of a crossing
+    are the nodes of the abstract graph; they are linked across the border
+    with the cost of the cell across (inter) and, inside a cluster, to the
+    other nodes of the cluster with their distance inside that cluster
+    (intra). costs[c] is the cost of a move into cell c (every move costs 1
+    if costs is None), so the edges are directed."""
+
+    def __init__(self, grid, cluster_size=10, costs=None):
+        self.grid = grid
+        self.walls = grid.walls
+        self.costs = costs
+        self.cluster_size = cluster_size
+        self.nb_cx = -(-grid.width // cluster_size)
+        self.nb_cy = -(-grid.height // cluster_size)
+        self.border_pairs = {}  # border -> [(cell, cell across)]
+        self.inter = {}  # cell -> [cells across a border]
+        self.intra = {}  # cluster -> {node: [(node2, distance)]}
+        self.rebuilt_clusters = 0  # clusters (re)built when the abstraction was made
+        for cluster in range(self.nb_cx * self.nb_cy):
+            for border in self.borders(cluster):
+                if border not in self.border_pairs:
+                    self.build_border(border)
+        for cluster in range(self.nb_cx * self.nb_cy):
+            self.build_cluster(cluster)
+
+    def cluster_of(self, cell):
+        x, y = self.grid.cells[cell]
+        return x // self.cluster_size + y // self.cluster_size * self.nb_cx
+
+    def bounds(self, cluster):
+        """Return x0, y0, x1, y1 (inclusive) of a cluster."""
+        cx, cy = cluster % self.nb_cx, cluster // self.nb_cx
+        x0, y0 = cx * self.cluster_size, cy * self.cluster_size
+        return (x0, y0, min(x0 + self.cluster_size, self.grid.width) - 1,
+                min(y0 + self.cluster_size, self.grid.height) - 1)
+
+    def borders(self, cluster):
+        """The borders of a cluster: ('v', c) is the border between c and the
+        cluster on its right, ('h', c) between c and the cluster below it."""
+        cx, cy = cluster % self.nb_cx, cluster // self.nb_cx
+        borders = []
+        if cx > 0:
+            borders.append(('v', cluster - 1))
+        if cx < self.nb_cx - 1:
+            borders.append(('v', cluster))
+        if cy > 0:
+            borders.append(('h', cluster - self.nb_cx))
+        if cy < self.nb_cy - 1:
+            borders.append(('h', cluster))
+        return borders
+
+    def build_border(self, border):
+        """(Re)compute the crossings of a border and update the inter edges."""
+        for a, b in self.border_pairs.get(border, ()):
+            self.inter[a].remove(b)
+            self.inter[b].remove(a)
+        orientation, cluster = border
+        x0, y0, x1, y1 = self.bounds(cluster)
+        width, walls = self.grid.width, self.walls
+        if orientation == 'v':
+            sides = [(x1 + y * width, x1 + 1 + y * width) for y in range(y0, y1 + 1)]
+        else:
+            sides = [(x + y1 * width, x + (y1 + 1) * width) for x in range(x0, x1 + 1)]
+        pairs, run = [], []
+        for a, b in sides + [(None, None)]:
+            if a is not None and not walls[a] and not walls[b]:
+                run.append((a, b))
+                continue
+            if len(run) >= 6:
+                pairs += [run[0], run[-1]]
+            elif run:
+                pairs.append(run[len(run) // 2])
+            run = []
+        self.border_pairs[border] = pairs
+        for a, b in pairs:
+            self.inter.setdefault(a, []).append(b)
+            self.inter.setdefault(b, []).append(a)
+
+    def build_cluster(self, cluster):
+        """(Re)compute the intra edges between the nodes of a cluster."""
+        nodes = set()
+        for border in self.borders(cluster):
+            for pair in self.border_pairs[border]:
+                nodes.update(c for c in pair if self.cluster_of(c) == cluster)
+        edges = {}
+        for node in nodes:
+            distances, _ = self.cluster_bfs(cluster, node, nodes)
+            edges[node] = [(other, distances[other]) for other in nodes
+                           if other != node and other in distances]
+        self.intra[cluster] = edges
+        self.rebuilt_clusters += 1
+
+    def cluster_bfs(self, cluster, source, targets=None):
+        """Breadth-first search (uniform cost search with costs) from source
+        without leaving cluster. Returns the distances and parents of the
+        cells reached (stopping early once every cell of targets, if given,
+        is reached)."""
+        if self.costs is not None:
+            return self.cluster_ucs(cluster, source, targets)
+        x0, y0, x1, y1 = self.bounds(cluster)
+        width, walls, cells = self.grid.width, self.walls, self.grid.cells
+        distances, parents = {source: 0}, {source: None}
+        remaining = set(targets) - {source} if targets is not None else None
+        layer = [source]
+        while layer and remaining != set():
+            next_layer = []
+            for c in layer:
+                x, y = cells[c]
+                for x2, y2 in ((x - 1, y), (x, y + 1), (x + 1, y), (x, y - 1)):
+                    if x0 <= x2 <= x1 and y0 <= y2 <= y1:
+                        c2 = x2 + y2 * width
+                        if not walls[c2] and c2 not in distances:
+                            distances[c2] = distances[c] + 1
+                            parents[c2] = c
+                            next_layer.append(c2)
+                            if remaining is not None:
+                                remaining.discard(c2)
+            layer = next_layer
+        return distances, parents
+
+    def cluster_ucs(self, cluster, source, targets=None):
+        """cluster_bfs with the move costs: Dijkstra's algorithm, where a
+        distance only counts once the cell is popped."""
+        x0, y0, x1, y1 = self.bounds(cluster)
+        width, walls, cells, costs = self.grid.width, self.walls, self.grid.cells, self.costs
+        g, parents, distances = {source: 0}, {source: None}, {}
+        remaining = set(targets) - {source} if targets is not None else None
+        frontier = [(0, source)]
+        while frontier and remaining != set():
+            d, c = heapq.heappop(frontier)
+            if c in distances:
+                continue
+            distances[c] = d
+            if remaining is not None:
+                remaining.discard(c)
+            x, y = cells[c]
+            for x2, y2 in ((x - 1, y), (x, y + 1), (x + 1, y), (x, y - 1)):
+                if x0 <= x2 <= x1 and y0 <= y2 <= y1:
+                    c2 = x2 + y2 * width
+                    d2 = d + costs[c2]
+                    if not walls[c2] and c2 not in distances and d2 < g.get(c2, UNREACHABLE):
+                        g[c2] = d2
+                        parents[c2] = c
+                        heapq.heappush(frontier, (d2, c2))
+        return distances, {c: parents[c] for c in distances}
+
+    def cost(self, cell):
+        """The cost of a move into cell."""
+        return 1 if self.costs is None else self.costs[cell]
+
+    def edges(self, node):
+        """The abstract edges (node2, cost) leaving an abstract node."""
+        edges = list(self.intra[self.cluster_of(node)].get(node, ()))
+        edges += [(other, self.cost(other)) for other in self.inter.get(node, ())]
+        return edges
+
+    def updated(self, grid, costs=None):
+        """Return the abstraction of grid, a layout of the same size, with the
+        move costs, made from this one by rebuilding only the clusters around
+        the cells whose wall or cost changed."""
+        new = ClusterAbstraction.__new__(ClusterAbstraction)
+        new.__dict__.update(self.__dict__)
+        new.grid, new.walls, new.costs = grid, grid.walls, costs
+        new.border_pairs = dict(self.border_pairs)
+        new.inter = {cell: list(others) for cell, others in self.inter.items()}
+        new.intra = dict(self.intra)
+        new.rebuilt_clusters = 0
+        dirty = {new.cluster_of(c) for c in range(grid.size)
+                 if grid.walls[c] != self.walls[c] or new.cost(c) != self.cost(c)}
+        borders = {border for cluster in dirty for border in new.borders(cluster)}
+        for border in borders:
+            new.build_border(border)
+        touched = set(dirty)
+        for orientation, cluster in borders:
+            touched.add(cluster)
+            touched.add(cluster + 1 if orientation == 'v' else cluster + new.nb_cx)
+        for cluster in touched:
+            new.build_cluster(cluster)
+        return new
+
+
+def compile_maze(maze):
+    """Return the MazeGrid of maze. Grids are cached by the layout of their
+    walls, so replanning on the same maze (with fewer diamonds) is free."""
+    return _compile_walls(tuple(row.translate(_WALLS_ONLY) for row in maze))
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_walls(walls):
+    return MazeGrid(walls)
+
+
+def compile_costs(terrain, width, height):
+    """Return the traversal costs of a width x height maze as bytes indexed
+    by cell id: costs[c] is what a move into cell c costs. terrain is a list
+    of strings laid out like the maze, where a digit '1'-'9' gives the cost
+    of its cell (mud, slopes...) and any other character costs 1. Without a
+    terrain every move costs 1."""
+    return _compile_costs(tuple(terrain) if terrain else None, width, height)
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_costs(terrain, width, height):
+    costs = bytearray(b'\x01') * (width * height)
+    for y, row in enumerate(terrain or ()):
+        for x, ch in enumerate(row):
+            if '1' <= ch <= '9':
+                costs[x + y * width] = int(ch)
+    return bytes(costs)
+
+
+# (width, height, cluster size) -> the last ClusterAbstraction built, for the
+# MAX_LATEST_ABSTRACTIONS sizes used last
+MAX_LATEST_ABSTRACTIONS = 8
+_latest_abstractions = OrderedDict()
+
+
+def generate_maze(width, height, wall_density=0.2, nb_diamonds=1, seed=None):
+    """Return a random maze layout of width x height (a list of strings)
+    surrounded by walls, with the agent 'A' in the top left corner and
+    nb_diamonds diamonds '*' on free cells. Inner cells are walls with
+    probability wall_density; the diamonds are not guaranteed to be reachable."""
+    rnd = random.Random(seed)
+    rows = [['#'] * width]
+    for y in range(1, height - 1):
+        rows.append(['#'] + ['#' if rnd.random() < wall_density else ' '
+                             for x in range(1, width - 1)] + ['#'])
+    rows.append(['#'] * width)
+    rows[1][1] = 'A'
+    free = [(x, y) for y in range(1, height - 1) for x in range(1, width - 1)
+            if rows[y][x] == ' ']
+    for x, y in rnd.sample(free, min(nb_diamonds, len(free))):
+        rows[y][x] = '*'
+    return [''.join(row) for row in rows]
+
+
+def generate_terrain(width, height, max_cost=9, patches=None, seed=None):
+    """Return a random terrain for a width x height maze (see compile_costs):
+    square patches of costly cells, each patch with a cost from 2 to max_cost,
+    on flat ground of cost 1."""
+    rnd = random.Random(seed)
+    rows = [[' '] * width for _ in range(height)]
+    if patches is None:
+        patches = width * height // 50
+    for _ in range(patches):
+        cost = str(rnd.randint(2, max_cost))
+        size = rnd.randint(1, max(1, min(width, height) // 8))
+        x0, y0 = rnd.randrange(width), rnd.randrange(height)
+        for y in range(y0, min(height, y0 + size)):
+            for x in range(x0, min(width, x0 + size)):
+                rows[y][x] = cost
+    return [''.join(row) for row in rows]
@@ -8,6 +8,7 @@
 # PriorityQueue is implemented here
 import functools
 import heapq
+from collections import OrderedDict, deque
 
 
 class PriorityQueue:
@@ -68,6 +69,384 @@ class PriorityQueue:
         heapq.heapify(self.heap)
 
 
+class IndexedPriorityQueue:
+    """A PriorityQueue that remembers the heap slot of every item, so that
+    membership, key lookup and deletion do not need to scan the heap.
+    Items are indexed by their hash/equality, so two Nodes with the same
+    state are the same entry (see Node.__eq__).
+    Appending an item that is already queued replaces it and moves it to its
+    new position (this is the decrease-key operation of best-first search).
+    Membership and lookup are O(1), append, pop and deletion are O(log n)."""
+
+    def __init__(self, order='min', f=lambda x: x):
+        self.heap = []
+        self.index = {}  # item -> position of its (f(item), item) entry in heap
+        if order == 'min':
+            self.f = f
+        elif order == 'max':  # now item with max f(x)
+            self.f = lambda x: -f(x)  # will be popped first
+        else:
+            raise ValueError("Order must be either 'min' or 'max'.")
+
+    def append(self, item):
+        """Insert item at its correct position. If an equal item is already
+        in the queue, it is replaced by item and moved according to f(item)."""
+        entry = (self.f(item), item)
+        i = self.index.get(item)
+        if i is None:
+            self.heap.append(entry)
+            self.index[item] = len(self.heap) - 1
+            self._sift_up(len(self.heap) - 1)
+        else:
+            old = self.heap[i]
+            # re-key the index so that it refers to the new item object
+            del self.index[item]
+            self.index[item] = i
+            self.heap[i] = entry
+            if entry < old:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+
+    def extend(self, items):
+        """Insert each item in items at its correct position."""
+        for item in items:
+            self.append(item)
+
+    def pop(self):
+        """Pop and return the item (with min or max f(x) value)
+        depending on the order."""
+        if not self.heap:
+            raise Exception('Trying to pop from empty PriorityQueue.')
+        item = self.heap[0][1]
+        self._remove(0)
+        del self.index[item]
+        return item
+
+    def __len__(self):
+        """Return current capacity of PriorityQueue."""
+        return len(self.heap)
+
+    def __contains__(self, key):
+        """Return True if the key is in PriorityQueue."""
+        return key in self.index
+
+    def __getitem__(self, key):
+        """Returns the value associated with key in PriorityQueue.
+        Raises KeyError if key is not present."""
+        try:
+            return self.heap[self.index[key]][0]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+
+    def __delitem__(self, key):
+        """Delete the occurrence of key."""
+        try:
+            i = self.index.pop(key)
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+        self._remove(i)
+
+    def _remove(self, i):
+        """Remove the entry at position i, filling the hole with the last entry."""
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.index[last[1]] = i
+            if i > 0 and last < self.heap[(i - 1) >> 1]:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+
+    def _sift_up(self, i):
+        heap, index = self.heap, self.index
+        entry = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not entry < heap[parent]:
+                break
+            heap[i] = heap[parent]
+            index[heap[i][1]] = i
+            i = parent
+        heap[i] = entry
+        index[entry[1]] = i
+
+    def _sift_down(self, i):
+        heap, index = self.heap, self.index
+        n = len(heap)
+        entry = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < entry:
+                break
+            heap[i] = heap[child]
+            index[heap[i][1]] = i
+            i = child
+        heap[i] = entry
+        index[entry[1]] = i
+
+
+class BucketQueue:
+    """A PriorityQueue for integer keys (Dial's algorithm): the items are kept
+    in one bucket per value of f(x), and a cursor remembers the smallest
+    bucket that may be non-empty. Pushing is O(1); popping is amortized O(1)
+    when the keys popped grow slowly, as the f values of uniform cost search
+    and A* with a consistent heuristic do.
+    Ties between items of the same f(x) are broken by tie(x) when given (the
+    lowest first, e.g. tie=lambda node: -node.path_cost prefers the deepest
+    nodes), then in first-in first-out order, or last-in first-out if lifo.
+    Like IndexedPriorityQueue, items are indexed by their hash/equality and
+    appending an item that is already queued replaces it. Replaced and
+    deleted items are dropped lazily, when they reach the front."""
+
+    def __init__(self, order='min', f=lambda x: x, tie=None, lifo=False):
+        if order != 'min':
+            raise ValueError("BucketQueue only supports order 'min'.")
+        self.f = f
+        self.tie = tie
+        self.lifo = lifo
+        self.buckets = {}  # f -> {tie -> deque of (f, tie, item) entries}
+        self.index = {}  # item -> its live entry
+        self.cursor = 0
+        self.size = 0
+
+    def append(self, item):
+        """Insert item in the bucket of f(item). If an equal item is already
+        in the queue, it is replaced by item."""
+        key = self.f(item)
+        if not isinstance(key, int):
+            raise ValueError('BucketQueue needs integer keys, got %r.' % (key,))
+        tie = self.tie(item) if self.tie else 0
+        entry = (key, tie, item)
+        if item in self.index:
+            del self.index[item]  # re-key the index with the new item object
+        else:
+            self.size += 1
+        self.index[item] = entry
+        if key < self.cursor or self.size == 1:
+            self.cursor = key
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = {}
+        queue = bucket.get(tie)
+        if queue is None:
+            queue = bucket[tie] = deque()
+        queue.append(entry)
+
+    def extend(self, items):
+        """Insert each item in items at its correct position."""
+        for item in items:
+            self.append(item)
+
+    def pop(self):
+        """Pop and return the item with min f(x)."""
+        if not self.size:
+            raise Exception('Trying to pop from empty PriorityQueue.')
+        buckets, index = self.buckets, self.index
+        while True:
+            bucket = buckets.get(self.cursor)
+            if bucket is None:
+                self._advance()
+                continue
+            tie = min(bucket) if len(bucket) > 1 else next(iter(bucket))
+            queue = bucket[tie]
+            entry = queue.pop() if self.lifo else queue.popleft()
+            if not queue:
+                del bucket[tie]
+                if not bucket:
+                    del buckets[self.cursor]
+            item = entry[2]
+            if index.get(item) is entry:
+                del index[item]
+                self.size -= 1
+                if not self.size:
+                    buckets.clear()  # only replaced or deleted entries are left
+                return item
+
+    def _advance(self):
+        """Move the cursor to the next non-empty bucket. After as many empty
+        steps as there are buckets, it jumps straight to the smallest one."""
+        buckets = self.buckets
+        for _ in range(len(buckets)):
+            self.cursor += 1
+            if self.cursor in buckets:
+                return
+        self.cursor = min(buckets)
+
+    def __len__(self):
+        """Return current capacity of PriorityQueue."""
+        return self.size
+
+    def __contains__(self, key):
+        """Return True if the key is in PriorityQueue."""
+        return key in self.index
+
+    def __getitem__(self, key):
+        """Returns the f value associated with key in PriorityQueue.
+        Raises KeyError if key is not present."""
+        try:
+            return self.index[key][0]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+
+    def __delitem__(self, key):
+        """Delete the occurrence of key."""
+        try:
+            del self.index[key]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+        self.size -= 1
+        if not self.size:
+            self.buckets.clear()
+
+
+_MISSING = object()
+
+
+class StateCache:
+    """A bounded cache of values keyed by state (or by any hashable key), e.g.
+    the heuristic values of a search (see search_algorithms.cached_heuristic). When maxsize entries
+    are held, adding one evicts another, chosen by policy:
+        'lru'    the least recently used entry
+        'clock'  the second-chance approximation of LRU: a hand sweeps over
+                 the entries and evicts the first one that was not used
+                 since its last visit (cheaper to maintain on every hit)
+    hits, misses and evictions count the lookups and evictions since the
+    cache was created. When the values depend on something else than the
+    key (e.g. the goals), bind(tag) empties the cache whenever it changes."""
+
+    def __init__(self, maxsize=100000, policy='lru'):
+        if policy not in ('lru', 'clock'):
+            raise ValueError("policy must be either 'lru' or 'clock'.")
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1.')
+        self.maxsize = maxsize
+        self.policy = policy
+        self.hits = self.misses = self.evictions = 0
+        self.tag = None
+        self.clear()
+
+    def clear(self):
+        """Forget every entry (the counters are kept)."""
+        if self.policy == 'lru':
+            self.entries = OrderedDict()
+        else:
+            self.entries = {}  # state -> slot in keys, values and referenced
+            self.keys = []
+            self.values = []
+            self.referenced = bytearray()
+            self.hand = 0
+
+    def bind(self, tag):
+        """Empty the cache if tag (e.g. the frozenset of the goals) differs
+        from the tag it was last bound to."""
+        if tag != self.tag:
+            self.clear()
+            self.tag = tag
+
+    def get(self, key, default=None):
+        """Return the value of key, or default if it is not cached."""
+        if self.policy == 'lru':
+            value = self.entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+        i = self.entries.get(key)
+        if i is None:
+            self.misses += 1
+            return default
+        self.referenced[i] = 1
+        self.hits += 1
+        return self.values[i]
+
+    def put(self, key, value):
+        """Cache value for key, evicting an entry if the cache is full."""
+        entries = self.entries
+        if self.policy == 'lru':
+            entries[key] = value
+            entries.move_to_end(key)
+            if len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+            return
+        i = entries.get(key)
+        if i is not None:
+            self.values[i] = value
+            self.referenced[i] = 1
+        elif len(self.keys) < self.maxsize:
+            entries[key] = len(self.keys)
+            self.keys.append(key)
+            self.values.append(value)
+            self.referenced.append(1)
+        else:
+            referenced, hand = self.referenced, self.hand
+            while referenced[hand]:
+                referenced[hand] = 0
+                hand = (hand + 1) % self.maxsize
+            del entries[self.keys[hand]]
+            entries[key] = hand
+            self.keys[hand] = key
+            self.values[hand] = value
+            referenced[hand] = 1
+            self.hand = (hand + 1) % self.maxsize
+            self.evictions += 1
+
+    def stats(self):
+        """The counters of the cache as a dict."""
+        return {'size': len(self.entries), 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+
+class SearchObserver:
+    """Watches a search while it runs. A search reports each expansion with
+    the expanded state and the states it added to the frontier.
+    Subclass this and override expanded to draw, log or record the search.
+    Searches skip the reporting altogether when enabled is False."""
+
+    enabled = True
+
+    def expanded(self, state, children):
+        """Called after state has been expanded; children is the list of
+        states that were added to (or updated in) the frontier."""
+        pass
+
+
+class NullObserver(SearchObserver):
+    """An observer for batch runs: nobody is watching, so searches run at full speed."""
+
+    enabled = False
+
+
+class RecordingObserver(SearchObserver):
+    """Buffers the expansion events so that they can be played back later,
+    e.g. on a canvas once the (timed) search is over."""
+
+    def __init__(self):
+        self.events = []
+
+    def expanded(self, state, children):
+        self.events.append((state, children))
+
+    def replay(self, observer):
+        """Send every recorded event, in order, to observer."""
+        for state, children in self.events:
+            observer.expanded(state, children)
+
+    def clear(self):
+        self.events = []
 
 
 class Problem:
@@ -76,12 +455,14 @@ class Problem:
     __init__, goal_test, and path_cost. Then you will create instances
     of your subclass and solve them with the various search functions."""
 
-    def __init__(self, initial=None, goal=None):
+    def __init__(self, initial=None, goal=None, observer=None):
         """The constructor specifies the initial state, and possibly a goal
-        state, if there is a unique goal. Your subclass's constructor can add
-        other arguments."""
+        state, if there is a unique goal. The observer (a SearchObserver)
+        is told about every expansion; by default nobody is watching.
+        Your subclass's constructor can add other arguments."""
         self.initial = initial
         self.goal = goal
+        self.observer = observer if observer is not None else NullObserver()
 
     def actions(self, state):
         """Return the actions that can be executed in the given
@@ -106,6 +487,12 @@ class Problem:
         else:
             return state == self.goal
 
+    def predecessors(self, state):
+        """Return the (action, state1) pairs such that executing action in
+        state1 leads to state, i.e. the reverse of get_successors. Needed by
+        the searches that also grow backward from the goal."""
+        raise NotImplementedError
+
     def path_cost(self, c, state1, action, state2):
         """Return the cost of a solution path that arrives at state2 from
         state1 via action, assuming cost c to get up to state1. If the problem
@@ -122,6 +509,11 @@ class Problem:
         and related algorithms try to maximize this value."""
         raise NotImplementedError
 
+    def display(self, state, children_nodes):
+        """Report the expansion of state, and the children nodes it added to
+        the frontier, to the observer of this problem."""
+        self.observer.expanded(state, [n.state for n in children_nodes])
+
 
 class Node:
     """A node in a search tree. Contains a pointer to the parent (the node
@@ -131,7 +523,11 @@ class Node:
     the total path_cost (also known as g) to reach the node. Other functions
     may add an f and h value; see best_first_graph_search and astar_search for
     an explanation of how the f and h values are handled. You will not need to
-    subclass this class."""
+    subclass this class.
+    Nodes have no __dict__: the f, h and g slots are reserved for the values
+    that searches attach to a node (e.g. best_first_graph_search sets f)."""
+
+    __slots__ = ('state', 'parent', 'action', 'path_cost', 'depth', 'f', 'h', 'g')
 
     def __init__(self, state, parent=None, action=None, path_cost=0):
         """Create a search tree Node, derived from a parent by an action."""
@@ -162,15 +558,21 @@ class Node:
 
     def solution(self):
         """Return the sequence of actions to go from the root to this node."""
-        return [node.action for node in self.path()[1:]]
+        node, actions = self, []
+        while node.parent is not None:
+            actions.append(node.action)
+            node = node.parent
+        actions.reverse()
+        return actions
 
     def path(self):
         """Return a list of nodes forming the path from the root to this node."""
         node, path_back = self, []
-        while node:
+        while node is not None:
             path_back.append(node)
             node = node.parent
-        return list(reversed(path_back))
+        path_back.reverse()
+        return path_back
 
     # We want for a queue of nodes in breadth_first_graph_search or
     # astar_search to have no duplicated states, so we treat nodes
@@ -16,10 +16,12 @@
 In search.py, you will implement generic search algorithms which are called by
 Pacman agents (in searchAgents.py).
 """
+import inspect
 import time
 
 from agents import *
-from problem import Problem
+from grid import OPPOSITE_ACTIONS, compile_maze
+from problem import Problem, SearchObserver, StateCache
 from search_algorithms import  *
 
 def get_defined_heuristics():
@@ -30,10 +32,31 @@ def get_defined_heuristics():
     return heuristics
 
 
-class DiamondExplorerProblem(Problem):
+class CanvasObserver(SearchObserver):
+    """Draws each expansion on the canvas of a DiamondExplorerEnv4Gui:
+    expanded states in red, frontier states in blue, then waits for the
+    animation speed selected in the GUI."""
+
     def __init__(self, environment):
-        Problem.__init__(self)
         self.environment = environment
+
+    def expanded(self, state, children):
+        x, y = state
+        self.environment.draw_rec(x, y, 'red')
+        for x, y in children:
+            self.environment.draw_rec(x, y, 'blue')
+        self.environment.canvas.update()
+        time.sleep(self.environment.speed.get() / 1000)
+
+
+class DiamondExplorerProblem(Problem):
+    def __init__(self, environment, observer=None):
+        if observer is None and hasattr(environment, 'canvas'):
+            observer = CanvasObserver(environment)
+        Problem.__init__(self, observer=observer)
+        self.environment = environment
+        self.costs = environment.costs
+        self._width = environment.width
         self.__set_initial()
         self.__set_goal()
         self._expanded = 0
@@ -70,19 +93,73 @@ class DiamondExplorerProblem(Problem):
             return None
         return state2
 
+    def predecessors(self, state):
+        """The moves that lead to state. A diamond cell only allows Grab,
+        so no move can start from it."""
+        self._expanded += 1
+        pairs = []
+        for action, opposite in OPPOSITE_ACTIONS.items():
+            x, y = Orientation.move(opposite, state)
+            if not self.environment.is_wall(x, y) and not self.environment.is_diamond(x, y):
+                pairs.append((action, (x, y)))
+        return pairs
+
+    def path_cost(self, c, state1, action, state2):
+        """c plus the cost of moving into state2, read from the cost array of
+        the environment. The searches that work on the MazeGrid directly
+        (except array_best_first_search) count every move as 1."""
+        return c + self.costs[state2[0] + state2[1] * self._width]
+
+    def cost_of_actions(self, actions):
+        state, cost = self.initial, 0
+        for action in actions:
+            if action is not Action.Grab:
+                state = self.get_successors(state, action)
+                cost = self.path_cost(cost, None, action, state)
+        return cost
+
     def value(self, state):
         """For optimization problems, each state has a value. Hill Climbing
         and related algorithms try to maximize this value."""
         return 0
 
-    def display(self, state, children_nodes):
+
+class CompiledDiamondExplorerProblem(DiamondExplorerProblem):
+    """A DiamondExplorerProblem that compiles the maze of the environment
+    into a MazeGrid once, so that actions and successors are table lookups
+    instead of wall tests. States are still (x, y) tuples, so it can be used
+    in place of DiamondExplorerProblem, e.g.
+    SearchAgent(env, prob='CompiledDiamondExplorerProblem')."""
+
+    def __init__(self, environment, observer=None):
+        DiamondExplorerProblem.__init__(self, environment, observer)
+        self.grid = compile_maze(environment.maze)
+        self.goal_states = frozenset(self.goal)
+        self._actions = self.grid.actions
+        self._moves = self.grid.moves
+
+    def actions(self, state):
+        self._expanded += 1
+        if state in self.goal_states:
+            return [Action.Grab]
+        x, y = state
+        return self._actions[x + y * self._width]
+
+    def get_successors(self, state, action):
+        if action is Action.Grab:
+            return state
         x, y = state
-        self.environment.draw_rec(x, y, 'red')
-        for n in children_nodes:
-            x, y = n.state
-            self.environment.draw_rec(x, y, 'blue')
-        self.environment.canvas.update()
-        time.sleep(self.environment.speed.get() / 1000)
+        return self._moves[x + y * self._width][action]
+
+    def predecessors(self, state):
+        self._expanded += 1
+        x, y = state
+        return [(OPPOSITE_ACTIONS[action], state1)
+                for action, state1 in self._moves[x + y * self._width].items()
+                if state1 not in self.goal_states]
+
+    def is_goal_state(self, state):
+        return state in self.goal_states
 
 
 class SearchAgent(Agent):
@@ -98,10 +175,34 @@ class SearchAgent(Agent):
       depthFirstSearch or dfs
       breadthFirstSearch or bfs
 
+    The observer (a SearchObserver) is handed to every problem the agent
+    builds. Leave it to None to draw the search on the GUI canvas, or pass a
+    NullObserver for headless batch runs.
+
+    replanning tells how the agent plans again once it has grabbed a diamond
+    and others remain: 'scratch' runs fn on a brand-new problem, while
+    'incremental' keeps a DStarLite planner for the whole episode (fn is then
+    not used) and only repairs what changed since the previous plan.
+
+    With a cache_size, the values of the heuristic are kept in
+    heuristic_cache, a StateCache of cache_size values with the given
+    cache_policy ('lru' or 'clock'), see cached_heuristic. It pays off for
+    expensive heuristics and for searches that evaluate a state many times
+    (IDA*, SMA*, ARA*). With cache_per_goal the values are kept per goal, so
+    they are shared by all the searches of the episode instead of only the
+    searches with the same goals. Its counters are printed with the search
+    stats.
+
+    fn may also be an anytime search, i.e. a generator of solutions of
+    decreasing cost such as ara_star. The agent then starts moving along the
+    first solution, and each following step lets the search look for a
+    better one (see improve_plan).
+
     Note: You should NOT change any code in SearchAgent
     """
 
-    def __init__(self, environment, fn='dfs', prob='DiamondExplorerProblem', heuristic='nullHeuristic'):
+    def __init__(self, environment, fn='dfs', prob='DiamondExplorerProblem', heuristic='nullHeuristic',
+                 observer=None, replanning='scratch', cache_size=None, cache_policy='lru', cache_per_goal=False):
         # Warning: some advanced Python magic is employed below to find the right functions and problems
         super().__init__(self)
 
@@ -112,6 +213,13 @@ class SearchAgent(Agent):
         self.total_cost = 0
         self.program = self.planing_program
         self.path_solution = None
+        self.observer = observer
+        if replanning not in ('scratch', 'incremental'):
+            raise ValueError("replanning must be either 'scratch' or 'incremental'.")
+        self.replanning = replanning
+        self.planner = None
+        self.improvements = None
+        self.heuristic_cache = StateCache(cache_size, cache_policy) if cache_size else None
         # Get the search function from the name and heuristic
         __my_global = globals()
         if fn not in __my_global.keys():
@@ -126,6 +234,8 @@ class SearchAgent(Agent):
             else:
                 raise AttributeError(heuristic + ' is not a function.')
             print('[SearchAgent] using function %s and heuristic %s' % (fn, heuristic))
+            if self.heuristic_cache is not None and my_heuristic is not nullHeuristic:
+                my_heuristic = cached_heuristic(my_heuristic, self.heuristic_cache, cache_per_goal)
             # Note: this bit of Python trickery combines the search algorithm and the heuristic
             self.searchFunction = lambda x: func(x, heuristic=my_heuristic)
         if prob not in globals().keys() or not prob.endswith('Problem'):
@@ -152,8 +262,14 @@ class SearchAgent(Agent):
         if self.searchFunction is None:
             raise Exception("No search function provided for SearchAgent")
         starttime = time.time()
-        problem = self.searchType(self.environment)  # Makes a new search problem
-        node = self.searchFunction(problem)  # Find a path
+        problem = self.searchType(self.environment, observer=self.observer)  # Makes a new search problem
+        if self.replanning == 'incremental':
+            node = self.incremental_search(problem)
+        else:
+            node = self.searchFunction(problem)  # Find a path
+        if inspect.isgenerator(node):
+            self.improvements = (node, problem)
+            node = next(node, None)
         if node:
             self.actions = node.solution()
             self.path_solution = node.path()
@@ -162,11 +278,59 @@ class SearchAgent(Agent):
             print('Path found with total cost of %d in %.1f seconds' % (totalCost, run_time))
             if '_expanded' in dir(problem):
                 print('Search nodes expanded: %d' % problem._expanded)
+            if '_peak_nodes' in dir(problem):
+                print('Peak nodes in memory: %d' % problem._peak_nodes)
+            if self.heuristic_cache is not None:
+                print('Heuristic cache: %(hits)d hits, %(misses)d misses, %(evictions)d evictions' %
+                      self.heuristic_cache.stats())
             self.total_cost += totalCost
             self.total_time += run_time
             self.nb_expand += problem._expanded
         else:
             print('No solution found!')
+            self.improvements = None
+
+    def incremental_search(self, problem):
+        """Plan with the DStarLite planner of the agent, creating it on the
+        first call and bringing it up to date with problem afterwards.
+        D* Lite counts every move as 1, so a problem with a terrain is
+        searched from scratch with array-backed A* instead."""
+        if problem.costs.count(1) != len(problem.costs):
+            return arrayAStarSearch(problem, manhattanHeuristic)
+        grid = getattr(problem, 'grid', None) or compile_maze(self.environment.maze)
+        if self.planner is None:
+            self.planner = DStarLite(grid, problem.initial, problem.goal)
+        else:
+            self.planner.update(grid, problem.initial, problem.goal)
+        node = self.planner.plan()
+        problem._expanded += self.planner.expanded
+        return node
+
+    def improve_plan(self, i):
+        """Run the anytime search until its next solution, while the agent is
+        at the i-th state of its path. When the new path goes through that
+        state and is shorter from there, the agent follows it instead."""
+        solutions, problem = self.improvements
+        expanded = problem._expanded
+        starttime = time.time()
+        node = next(solutions, None)
+        self.total_time += time.time() - starttime
+        self.nb_expand += problem._expanded - expanded
+        if node is None:
+            self.improvements = None
+            return
+        here = self.path_solution[i]
+        for j, step in enumerate(node.path()):
+            if step.state == here.state:
+                remaining = node.path_cost - step.path_cost
+                old_remaining = self.path_solution[-1].path_cost - here.path_cost
+                if remaining < old_remaining:
+                    print('Improved path with total cost of %d (weight %.1f)' % (node.path_cost, problem._weight))
+                    self.actions = node.solution()
+                    self.path_solution = node.path()
+                    self.actionIndex = j
+                    self.total_cost += remaining - old_remaining
+                break
 
     def getAction(self, state):
         """
@@ -178,14 +342,17 @@ class SearchAgent(Agent):
         if 'actionIndex' not in dir(self):
             self.actionIndex = 0
 
+        if self.improvements is not None and self.actionIndex < len(self.actions):
+            self.improve_plan(self.actionIndex)
         i = self.actionIndex
         self.actionIndex += 1
         if i < len(self.actions):
             return self.actions[i]
         elif i == len(self.actions):
+            self.improvements = None
             return Action.Grab
         else:
-            if self.environment.get_diamond_location():
+            if self.environment.has_diamonds():
                 self.actions = None
                 self.actionIndex = 0
                 return Action.NoOp
@@ -1,8 +1,17 @@
 #import sys, os
 
 #sys.path.extend([f'{item[0]}' for item in os.walk(".") if os.path.isdir(item[0])])
-from problem import Node, PriorityQueue, memoize  # Ignore this error
+from problem import Node, IndexedPriorityQueue, BucketQueue  # Ignore this error
+from agents import Action
+from grid import MOVES, UNREACHABLE, compile_maze
+from array import array
 from collections import deque
+import functools
+import heapq
+import itertools
+import time
+
+import numpy as np
 
 
 def depthFirstSearch(problem):
@@ -16,6 +25,7 @@ def depthFirstSearch(problem):
      understand the search problem that is being passed in:
      """
     print("depthFirstSearch ......... ")
+    observe = problem.display if problem.observer.enabled else None
     frontier = [Node(problem.initial)]  # Stack
     explored = set()
     while frontier:
@@ -30,7 +40,8 @@ def depthFirstSearch(problem):
         for node in next_node.expand(problem):
             if node.state not in explored and node not in frontier:
                 frontier.append(node)
-        problem.display(next_node.state, frontier)
+        if observe:
+            observe(next_node.state, frontier)
     return None
 
 
@@ -40,47 +51,77 @@ def breadthFirstSearch(problem):
     raise ValueError('Not Defined!')
 
 
-def best_first_graph_search(problem, f, display=False):
+def _node_f(node):
+    return node.f
+
+
+def best_first_graph_search(problem, f, display=False, queue='heap', tie=None, score=None):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
-    first search; if f is node.depth then we have breadth-first search. """
-    f = memoize(f, 'f')
+    first search; if f is node.depth then we have breadth-first search.
+    queue is 'heap' (an IndexedPriorityQueue) or 'bucket' (a BucketQueue,
+    when f only takes integer values). Ties go to the smallest tie(node),
+    then to the smallest state ('heap') or the oldest node ('bucket').
+    The f value of a node is computed once and kept in node.f. score, if
+    given, is called instead of f with the children of each expansion, and
+    sets all their f values at once.
+    Expensive heuristics are best cached by state (see cached_heuristic). """
+    observe = problem.display if problem.observer.enabled else None
     node = Node(problem.initial)
-    frontier = PriorityQueue('min', f)
-    print(frontier)
+    node.f = f(node)
+    key = _node_f
+    if queue == 'bucket':
+        frontier = BucketQueue('min', _node_f, tie)
+    elif queue == 'heap':
+        if tie is not None:
+            def f_then_tie(node):
+                return node.f, tie(node)
+            key = f_then_tie
+        frontier = IndexedPriorityQueue('min', key)
+    else:
+        raise ValueError("queue must be either 'heap' or 'bucket'.")
     frontier.append(node)
-    print(frontier)
     explored = set()
     while frontier:
         node = frontier.pop()
         if problem.is_goal_state(node.state):
             if display:
-                if display:
-                    print(len(explored), "paths have been expanded and", len(frontier), "paths remain in the frontier")
+                print(len(explored), "paths have been expanded and", len(frontier), "paths remain in the frontier")
             return node
         explored.add(node.state)
         to_expand = []
-        for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+        children = [child for child in node.expand(problem) if child.state not in explored]
+        if score:
+            score(children)
+        else:
+            for child in children:
+                child.f = f(child)
+        for child in children:
+            if child not in frontier:
                 frontier.append(child)
                 to_expand.append(child)
-            elif child in frontier:
-                if f(child) < frontier[child]:
-                    del frontier[child]
-                    frontier.append(child)
-                    to_expand.append(child)
-        problem.display(node.state, to_expand)
+            elif key(child) < frontier[child]:
+                # decrease-key: the queue replaces the queued node in place
+                frontier.append(child)
+                to_expand.append(child)
+        if observe:
+            observe(node.state, to_expand)
     return None
 
 
 
-def uniformCostSearch(problem):
+def uniformCostSearch(problem, queue='heap'):
     """Search the node of least total cost first.
     Note that each Node has its own path_cost
     attribute that you as cost function value."""
-    "*** YOUR CODE HERE ***"
-    raise ValueError('Not Defined!')
+    return best_first_graph_search(problem, lambda node: node.path_cost, queue=queue)
+
+
+def bucketUniformCostSearch(problem):
+    """uniformCostSearch with a BucketQueue frontier."""
+    return uniformCostSearch(problem, queue='bucket')
+
 # uniform cost search doesn't use heuristics, but the greedy search and A* use them.
 # so we need to define some heuristic function
 
@@ -96,6 +137,29 @@ def euclideanHeuristic(node, problem):
     return min(map(lambda x: distance_squared(node.state, x), problem.goal))
 
 
+def goalDistanceHeuristic(node, problem):
+    """The number of moves to the nearest goal, read from the distance field
+    of the goals: the exact remaining cost when every move costs 1 (then
+    A*, which breaks ties toward the deepest node, expands only the solution
+    path), and still a lower bound on a terrain (where moves cost 1 or more)."""
+    x, y = node.state
+    field = _goal_distance_field(problem)
+    return field.distances[x + y * field.width]
+
+
+def _goal_distance_field(problem):
+    """The DistanceField of the goals of a grid problem, kept on the problem."""
+    field = getattr(problem, 'distance_field', None)
+    if field is None:
+        goal_distances = getattr(problem.environment, 'goal_distances', None)
+        if goal_distances is not None:
+            field = goal_distances()
+        else:
+            field = _problem_grid(problem).distance_field(problem.goal)
+        problem.distance_field = field
+    return field
+
+
 ## distance functions can be used as heuristics
 def distance_squared(a, b):
     """The square of the distance between two (x, y) points."""
@@ -108,8 +172,440 @@ def manhattan_distance(xy1, xy2):
     "Returns the Manhattan distance between points xy1 and xy2"
     return abs(xy1[0] - xy2[0]) + abs(xy1[1] - xy2[1])
 
-# add a new heuristic called 'manhattanHeuristic' based on manhattan distance
-# *** YOUR CODE HERE ***
+
+def manhattanHeuristic(node, problem):
+    """Manhattan distance to the nearest goal (admissible with unit moves)."""
+    return min(map(lambda x: manhattan_distance(node.state, x), problem.goal))
+
+
+def landmarkHeuristic(node, problem):
+    """ALT heuristic: the best lower bound that the triangle inequality gives
+    through the landmarks of the maze, max over L of |d(L, n) - d(L, g)|,
+    for the nearest goal g. Much tighter than Manhattan in mazes full of walls;
+    the landmark tables are computed once per maze (see MazeGrid.landmarks)."""
+    landmarks, goal_vectors = _landmark_tables(problem)
+    c = node.state[0] + node.state[1] * landmarks.grid.width
+    vector = [table[c] for table in landmarks.tables]
+    best = None
+    for goal_vector in goal_vectors:
+        h = 0
+        for a, b in zip(vector, goal_vector):
+            if a != UNREACHABLE and b != UNREACHABLE and abs(a - b) > h:
+                h = abs(a - b)
+        if best is None or h < best:
+            best = h
+    return best or 0
+
+
+def _landmark_tables(problem):
+    """The Landmarks of the maze of a grid problem and the landmark vectors of
+    its goals, kept on the problem."""
+    tables = getattr(problem, 'landmark_tables', None)
+    if tables is None:
+        landmarks = _problem_grid(problem).landmarks()
+        tables = problem.landmark_tables = (landmarks, [landmarks.vector(g) for g in problem.goal])
+    return tables
+
+
+# ______________________________________________________________________________
+# Batched heuristics
+# A batch heuristic scores a whole batch of states with one NumPy call against
+# the array of the goal coordinates, instead of a Python loop over the goals
+# for every node. aStarSearch scores all the children of an expansion at
+# once, and the array searches score blocks of _BATCH_CELLS consecutive
+# cells (walls included), the first time they need a cell of the block.
+
+class _BatchHeuristic:
+    """A heuristic with a batch(states, problem) function that returns the
+    NumPy array of the h values of a sequence of (x, y) states. Calling it
+    on a single node, heuristic(node, problem), works as well, so it can be
+    used by any search."""
+
+    def __init__(self, batch):
+        self.batch = batch
+        functools.update_wrapper(self, batch)
+
+    def __call__(self, node, problem):
+        return self.batch([node.state], problem)[0].item()
+
+
+def _goal_array(problem):
+    """The (number of goals, 2) array of the goal coordinates, kept on the problem."""
+    goals = getattr(problem, 'goal_array', None)
+    if goals is None:
+        goals = problem.goal_array = np.array(list(problem.goal), dtype=np.int64).reshape(-1, 2)
+    return goals
+
+
+def _goal_offsets(states, problem):
+    """The (number of states, number of goals, 2) array of state - goal differences."""
+    return np.asarray(states, dtype=np.int64).reshape(-1, 1, 2) - _goal_array(problem)[np.newaxis]
+
+
+@_BatchHeuristic
+def batchManhattanHeuristic(states, problem):
+    """Manhattan distance to the nearest goal, for a batch of states."""
+    if not problem.goal:
+        return np.zeros(len(states), dtype=np.int64)
+    return np.abs(_goal_offsets(states, problem)).sum(axis=2).min(axis=1)
+
+
+@_BatchHeuristic
+def batchEuclideanHeuristic(states, problem):
+    """Straight-line distance to the nearest goal, for a batch of states (the
+    distance itself, not its square as in euclideanHeuristic, so it is
+    admissible)."""
+    if not problem.goal:
+        return np.zeros(len(states))
+    return np.sqrt(np.square(_goal_offsets(states, problem)).sum(axis=2).min(axis=1))
+
+
+@_BatchHeuristic
+def batchGoalDistanceHeuristic(states, problem):
+    """The maze distance to the nearest goal, for a batch of states: one
+    gather in the distance field of the goals (see goalDistanceHeuristic)."""
+    field = _goal_distance_field(problem)
+    distances = getattr(problem, 'distance_array', None)
+    if distances is None:
+        distances = problem.distance_array = np.asarray(field.distances, dtype=np.int64)
+    cells = np.asarray(states, dtype=np.int64).reshape(-1, 2)
+    return distances[cells[:, 0] + cells[:, 1] * field.width]
+
+
+# ______________________________________________________________________________
+# Heuristic cache
+# A heuristic only depends on the state and the goals, so its values can be
+# kept in a StateCache (see problem.py) bound to the goals, and shared by all
+# the nodes of a state, the iterations of IDA*, the nodes that SMA* forgets
+# and regenerates, and the rounds of ARA*. The heuristics of this module are
+# also the min over the goals of a value for a single goal: keyed by
+# (state, goal), these values stay valid when a goal is removed, and can be
+# shared by the successive searches of a SearchAgent as it grabs the
+# diamonds. That costs one lookup per goal for each node, so it only pays
+# for expensive heuristics (per_goal of cached_heuristic).
+
+class _SingleGoalView:
+    """A grid problem seen as if goal were its only goal, on which a
+    heuristic computes the value of one goal (and keeps its tables, e.g. the
+    distance field of that goal). Other attributes are the problem's."""
+
+    def __init__(self, problem, goal):
+        self.problem = problem
+        self.goal = [goal]
+        self.environment = None  # its goal_distances are for all the goals
+        self.grid = _problem_grid(problem)
+
+    def __getattr__(self, name):
+        return getattr(self.problem, name)
+
+
+def _single_goal_views(problem):
+    """The (goal, _SingleGoalView) pairs of the goals of problem, kept on the problem."""
+    views = getattr(problem, 'single_goal_views', None)
+    if views is None:
+        views = problem.single_goal_views = [(goal, _SingleGoalView(problem, goal)) for goal in problem.goal]
+    return views
+
+
+def cached_heuristic(heuristic, cache, per_goal=False):
+    """Return heuristic with its values looked up in cache (a StateCache)
+    first. The values are keyed by node.state, and the cache is bound to the
+    goals of each problem it is used on (cache.bind), so it is emptied when
+    the goals change. A batch heuristic stays a batch heuristic: only the
+    states missing from the cache are scored, in one call.
+    With per_goal (for expensive heuristics, not batch ones), the values are
+    kept by (node.state, goal), each computed on a single-goal view of the
+    problem, and the min is taken over the goals of the problem: the cache
+    is not emptied when a goal is removed."""
+    get, put = cache.get, cache.put
+    bound = [None]  # the problem the cache was last bound for
+
+    def bind(problem):
+        cache.bind(frozenset(problem.goal))
+        bound[0] = problem
+
+    def cached(node, problem):
+        if problem is not bound[0]:
+            bind(problem)
+        value = get(node.state)
+        if value is None:
+            value = heuristic(node, problem)
+            put(node.state, value)
+        return value
+
+    def cached_per_goal(node, problem):
+        state, best = node.state, None
+        for goal, view in _single_goal_views(problem):
+            value = get((state, goal))
+            if value is None:
+                value = heuristic(node, view)
+                put((state, goal), value)
+            if best is None or value < best:
+                best = value
+        return heuristic(node, problem) if best is None else best
+
+    def cached_batch(states, problem):
+        if problem is not bound[0]:
+            bind(problem)
+        values = [get(state) for state in states]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            computed = heuristic.batch([states[i] for i in missing], problem).tolist()
+            for i, value in zip(missing, computed):
+                values[i] = value
+                put(states[i], value)
+        return np.array(values)
+
+    if hasattr(heuristic, 'batch'):
+        wrapper = _BatchHeuristic(cached_batch)
+    elif per_goal:
+        wrapper = cached_per_goal
+    else:
+        wrapper = cached
+    functools.update_wrapper(wrapper, heuristic, updated=())
+    return wrapper
+
+
+# ______________________________________________________________________________
+# Memory-bounded searches
+# best_first_graph_search keeps its whole frontier and explored set. These
+# two trade time for memory: IDA* only holds the current path (plus a
+# transposition table of bounded size), SMA* never holds more than max_nodes
+# nodes. Both leave the peak number of nodes they held in problem._peak_nodes.
+
+def iterativeDeepeningAStarSearch(problem, heuristic=nullHeuristic, table_size=100000):
+    """Depth-first searches bounded by f = g + h, the bound growing to the
+    smallest f that exceeded it, until a goal is found within the bound.
+    The transposition table remembers the smallest g with which each state
+    was reached in the current iteration (at most table_size states, the
+    oldest are forgotten first) to prune the paths that reach it again."""
+    root = Node(problem.initial)
+    problem._peak_nodes = 1
+    if problem.is_goal_state(root.state):
+        return root
+
+    def children_of(node):
+        return [child for child in node.expand(problem) if child.state != node.state]
+
+    bound = heuristic(root, problem)
+    while True:
+        table = {root.state: 0}
+        next_bound = float('inf')
+        path = {root.state}
+        children = children_of(root)
+        stack = [[root, children, 0]]
+        live = 1 + len(children)  # nodes currently held
+        while stack:
+            frame = stack[-1]
+            node, children, i = frame
+            if i == len(children):
+                stack.pop()
+                path.discard(node.state)
+                live -= 1
+                continue
+            frame[2] = i + 1
+            child = children[i]
+            f = child.path_cost + heuristic(child, problem)
+            if f > bound:
+                next_bound = min(next_bound, f)
+                live -= 1
+                continue
+            if problem.is_goal_state(child.state):
+                return child
+            if child.state in path or table.get(child.state, _INFINITY) <= child.path_cost:
+                live -= 1
+                continue
+            if child.state not in table and len(table) >= table_size:
+                del table[next(iter(table))]
+            table[child.state] = child.path_cost
+            grandchildren = children_of(child)
+            live += len(grandchildren)
+            problem._peak_nodes = max(problem._peak_nodes, live)
+            stack.append([child, grandchildren, 0])
+            path.add(child.state)
+        if next_bound == float('inf'):
+            return None
+        bound = next_bound
+
+
+class _MemoryNode(Node):
+    """A Node of the SMA* tree, which knows its children currently in memory
+    and the smallest f among its children that were forgotten."""
+    __slots__ = ('children', 'forgotten', 'expanded', 'alive', 'open_key')
+
+    def __init__(self, state, parent=None, action=None, path_cost=0):
+        super().__init__(state, parent, action, path_cost)
+        self.children = []
+        self.forgotten = float('inf')
+        self.expanded = False
+        self.alive = True
+        self.open_key = None
+
+
+def simplifiedMemoryBoundedAStarSearch(problem, heuristic=nullHeuristic, max_nodes=10000):
+    """SMA*: A* that holds at most max_nodes nodes between two expansions.
+    When memory is full, the worst leaf (highest f, then shallowest) is
+    forgotten and its f is backed up in its parent, which will regenerate it
+    if the rest of the tree turns out worse. The open list holds the nodes with successors to
+    generate, keyed by their f (or by the best f they forgot), the deepest
+    first among equal keys. A child is not generated when a node in memory
+    already reaches its state at no greater cost, otherwise the tree would
+    hold every path through the open areas of a maze.
+    Optimal when the optimal path fits in memory."""
+    infinity = float('inf')
+    counter = itertools.count()
+    open_heap, leaf_heap = [], []
+
+    def push_open(node, key):
+        node.open_key = key
+        heapq.heappush(open_heap, (key, -node.depth, next(counter), node))
+
+    def push_leaf(node):
+        heapq.heappush(leaf_heap, (-node.f, node.depth, next(counter), node))
+
+    def backup(node):
+        """Recompute f = min(children f, forgotten f) up the tree while it changes."""
+        while node is not None and node.expanded and node.alive:
+            f = min([c.f for c in node.children], default=infinity)
+            f = min(f, node.forgotten)
+            if f == node.f:
+                break
+            node.f = f
+            if not node.children:
+                push_leaf(node)
+            node = node.parent
+
+    def forget_worst():
+        while leaf_heap:
+            neg_f, _, _, node = heapq.heappop(leaf_heap)
+            if (node.alive and not node.children and node.parent is not None
+                    and -neg_f == node.f):
+                break
+        else:
+            return False
+        node.alive = False
+        if held.get(node.state) is node:
+            del held[node.state]
+        parent = node.parent
+        parent.children.remove(node)
+        parent.forgotten = min(parent.forgotten, node.f)
+        push_open(parent, parent.forgotten)
+        if not parent.children:
+            push_leaf(parent)
+        return True
+
+    root = _MemoryNode(problem.initial)
+    root.f = heuristic(root, problem)
+    push_open(root, root.f)
+    push_leaf(root)
+    held = {root.state: root}  # state -> cheapest node in memory for it
+    used = problem._peak_nodes = 1
+    while True:
+        while open_heap and (not open_heap[0][3].alive or open_heap[0][3].open_key != open_heap[0][0]):
+            heapq.heappop(open_heap)
+        if not open_heap or open_heap[0][0] == infinity:
+            return None
+        key, _, _, best = heapq.heappop(open_heap)
+        best.open_key = None
+        if not best.expanded and problem.is_goal_state(best.state):
+            return best
+        present = {child.state for child in best.children}
+        for action in problem.actions(best.state):
+            state = problem.get_successors(best.state, action)
+            if state in present:
+                continue
+            g = problem.path_cost(best.path_cost, best.state, action, state)
+            other = held.get(state)
+            if other is not None and other.path_cost <= g:
+                continue
+            child = _MemoryNode(state, best, action, g)
+            held[state] = child
+            if child.depth >= max_nodes - 1 and not problem.is_goal_state(state):
+                child.f = infinity  # its path could not be held in memory
+            else:
+                child.f = max(key, child.path_cost + heuristic(child, problem))
+            best.children.append(child)
+            push_open(child, child.f)
+            push_leaf(child)
+            used += 1
+        best.expanded = True
+        best.forgotten = infinity
+        best.f = None  # recomputed by backup
+        backup(best)
+        problem._peak_nodes = max(problem._peak_nodes, used)
+        while used > max_nodes and forget_worst():
+            used -= 1
+
+
+# ______________________________________________________________________________
+# Anytime search: ARA*
+# A first path is found quickly with an inflated heuristic, then the weight
+# is lowered step by step and the search is repaired, reusing its open and
+# closed lists, until the path is proven optimal or the time is up.
+
+def anytimeRepairingAStarSearch(problem, heuristic=nullHeuristic, weight=3, decrement=0.5, time_limit=1.0):
+    """ARA*: a generator that yields goal Nodes of decreasing path cost.
+    Each round is a weighted A* (f = g + weight * h) that only re-expands the
+    states whose g improved since they were expanded: they wait in an
+    inconsistent list until the next round. The solution of a round costs at
+    most weight times the optimal cost; problem._weight is set to that weight
+    before each yield.
+    The first solution is always searched to the end; the next rounds stop
+    when time_limit seconds have passed since the search started."""
+    deadline = time.perf_counter() + time_limit
+    observe = problem.display if problem.observer.enabled else None
+    h_values = {}
+
+    def f(node):
+        h = h_values.get(node.state)
+        if h is None:
+            h = h_values[node.state] = heuristic(node, problem)
+        return node.path_cost + weight * h
+
+    root = Node(problem.initial)
+    best = {root.state: root}  # state -> node with the smallest g found so far
+    frontier = IndexedPriorityQueue('min', f)
+    frontier.append(root)
+    closed, inconsistent = set(), {}
+    incumbent = root if problem.is_goal_state(root.state) else None
+    yielded = None
+    while True:
+        while frontier and (incumbent is None or frontier.heap[0][0] < incumbent.path_cost):
+            if yielded is not None and time.perf_counter() > deadline:
+                return
+            node = frontier.pop()
+            closed.add(node.state)
+            to_expand = []
+            for child in node.expand(problem):
+                known = best.get(child.state)
+                if known is not None and known.path_cost <= child.path_cost:
+                    continue
+                best[child.state] = child
+                if problem.is_goal_state(child.state) and (
+                        incumbent is None or child.path_cost < incumbent.path_cost):
+                    incumbent = child
+                if child.state in closed:
+                    inconsistent[child.state] = child
+                else:
+                    frontier.append(child)
+                    to_expand.append(child)
+            if observe:
+                observe(node.state, to_expand)
+        if incumbent is None:
+            return
+        if yielded is None or incumbent.path_cost < yielded.path_cost:
+            problem._weight = weight
+            yielded = incumbent
+            yield incumbent
+        if weight <= 1:
+            return
+        weight = max(1, weight - decrement)
+        # f depends on weight: queue the open and inconsistent nodes again
+        nodes = [node for _, node in frontier.heap]
+        nodes.extend(inconsistent.values())
+        frontier = IndexedPriorityQueue('min', f)
+        frontier.extend(nodes)
+        closed, inconsistent = set(), {}
 
 
 def greedyBestFirstSearch(problem, heuristic=nullHeuristic):
@@ -117,10 +613,733 @@ def greedyBestFirstSearch(problem, heuristic=nullHeuristic):
     raise ValueError('Not Defined!')
 
 
-def aStarSearch(problem, heuristic=nullHeuristic):
-    """Search the node that has the lowest combined cost and heuristic first."""
-    "*** YOUR CODE HERE ***"
-    raise ValueError('Not Defined!')
+def aStarSearch(problem, heuristic=nullHeuristic, queue='heap'):
+    """Search the node that has the lowest combined cost and heuristic first.
+    Ties go to the node with the highest path cost, which is the closest to
+    a goal. A batch heuristic (e.g.
+    batchManhattanHeuristic) scores all the children of a node at once."""
+    def batch_score(children):
+        h = heuristic.batch([child.state for child in children], problem).tolist()
+        for child, h_child in zip(children, h):
+            child.f = child.path_cost + h_child
+    return best_first_graph_search(problem, lambda node: node.path_cost + heuristic(node, problem),
+                                   queue=queue, tie=lambda node: -node.path_cost,
+                                   score=batch_score if hasattr(heuristic, 'batch') else None)
+
+
+def bucketAStarSearch(problem, heuristic=nullHeuristic):
+    """aStarSearch with a BucketQueue frontier; heuristic must return integers."""
+    return aStarSearch(problem, heuristic, queue='bucket')
+
+
+# ______________________________________________________________________________
+# Array-backed searches over a MazeGrid
+# Instead of a Node per generated state and a set of explored tuples, these
+# searches keep open/closed status in a bytearray indexed by cell id and the
+# parents and g values in preallocated array('i') buffers. Only the nodes of
+# the solution path are built, once the goal is reached.
+
+_OPEN, _CLOSED = 1, 2
+_INFINITY = 2 ** 31 - 1
+
+
+def _problem_grid(problem):
+    """Return the MazeGrid of a grid problem (compiling the maze of its
+    environment if the problem is not a CompiledDiamondExplorerProblem)."""
+    grid = getattr(problem, 'grid', None)
+    if grid is None:
+        grid = compile_maze(problem.environment.maze)
+    return grid
+
+
+def _unit_costs(problem):
+    """Whether every move of problem costs 1 (it has no terrain)."""
+    costs = getattr(problem, 'costs', None)
+    return not costs or costs.count(1) == len(costs)
+
+
+def _weighted_search(problem):
+    """The search that stands in for the unit-cost searches below on a problem
+    with a terrain, where they would return paths that are not the cheapest:
+    array-backed A* with the Manhattan heuristic (admissible, as every move
+    costs at least 1)."""
+    return array_best_first_search(problem, manhattanHeuristic)
+
+
+class _StateView:
+    """Stands for a Node when a heuristic(node, problem) is evaluated on a bare state."""
+    __slots__ = ('state',)
+
+
+_BATCH_CELLS = 16
+
+
+def _heuristic_on_cells(heuristic, problem, grid):
+    """Return h(cell) for a heuristic written for nodes, or None for nullHeuristic.
+    A batch heuristic is evaluated on blocks of _BATCH_CELLS cells, the
+    first time h is asked for a cell of the block."""
+    if heuristic is None or heuristic is nullHeuristic:
+        return None
+    if hasattr(heuristic, 'batch'):
+        cells = grid.cells
+        values = [None] * grid.size
+
+        def h_batch(cell):
+            value = values[cell]
+            if value is None:
+                start = cell - cell % _BATCH_CELLS
+                block = cells[start:start + _BATCH_CELLS]
+                values[start:start + len(block)] = heuristic.batch(block, problem).tolist()
+                value = values[cell]
+            return value
+
+        return h_batch
+    view = _StateView()
+    cells = grid.cells
+
+    def h(cell):
+        view.state = cells[cell]
+        return heuristic(view, problem)
+
+    return h
+
+
+def _grid_solution_node(grid, parent, move, g, cell):
+    """Rebuild the Node chain from the root to cell out of the parent array."""
+    cells = []
+    while cell != -1:
+        cells.append(cell)
+        cell = parent[cell]
+    node = None
+    for c in reversed(cells):
+        action = MOVES[move[c]][0] if node else None
+        node = Node(grid.cells[c], node, action, g[c])
+    return node
+
+
+def array_best_first_search(problem, heuristic=None, weight=1):
+    """Best-first graph search with f = g + weight * h over the MazeGrid of a
+    grid problem, where a move costs problem.costs of the cell it enters (1
+    if the problem has no costs). With no heuristic it is a uniform cost
+    search, with a heuristic it is (weighted) A*, whose ties go to the
+    cell with the highest g. Returns the goal Node (with its path back to
+    the root), or None."""
+    grid = _problem_grid(problem)
+    size, width, neighbors = grid.size, grid.width, grid.neighbors
+    costs = getattr(problem, 'costs', None) or bytes([1]) * size
+    h = _heuristic_on_cells(heuristic, problem, grid)
+    observer = problem.observer if problem.observer.enabled else None
+    g = array('i', [_INFINITY]) * size
+    parent = array('i', [-1]) * size
+    move = bytearray(size)  # index in MOVES of the move that reached each cell
+    status = bytearray(size)
+    goals = bytearray(size)
+    for x, y in problem.goal:
+        goals[x + y * width] = 1
+
+    start = grid.cell_id(problem.initial)
+    g[start] = 0
+    status[start] = _OPEN
+    frontier = [(weight * h(start) if h else 0, 0, start)]
+    while frontier:
+        _, _, cell = heapq.heappop(frontier)
+        if status[cell] == _CLOSED:
+            continue  # a stale entry, the cell was reached again more cheaply
+        if goals[cell]:
+            return _grid_solution_node(grid, parent, move, g, cell)
+        status[cell] = _CLOSED
+        problem._expanded += 1
+        children = []
+        g1 = g[cell]
+        for k in range(4):
+            child = neighbors[4 * cell + k]
+            if child < 0 or status[child] == _CLOSED:
+                continue
+            g2 = g1 + costs[child]
+            if g2 >= g[child]:
+                continue
+            g[child] = g2
+            parent[child] = cell
+            move[child] = k
+            status[child] = _OPEN
+            heapq.heappush(frontier, (g2 + weight * h(child) if h else g2, -g2, child))
+            children.append(child)
+        if observer:
+            observer.expanded(grid.cells[cell], [grid.cells[c] for c in children])
+    return None
+
+
+def arrayUniformCostSearch(problem):
+    """Uniform cost search with array-backed bookkeeping (see array_best_first_search)."""
+    return array_best_first_search(problem)
+
+
+def arrayAStarSearch(problem, heuristic=nullHeuristic):
+    """A* search with array-backed bookkeeping (see array_best_first_search)."""
+    return array_best_first_search(problem, heuristic)
+
+
+def distanceFieldSearch(problem):
+    """No search at all: walk down the distance field of the goals from the
+    initial state, which follows a path of fewest moves in O(path length)
+    once the field is known. The field counts moves, so a problem with a
+    terrain is searched with _weighted_search instead. Returns the goal Node,
+    or None."""
+    if not _unit_costs(problem):
+        return _weighted_search(problem)
+    moves = _goal_distance_field(problem).descent(problem.initial)
+    if moves is None:
+        return None
+    node = Node(problem.initial)
+    for action, state in moves:
+        node = Node(state, node, action, node.path_cost + 1)
+    return node
+
+
+# ______________________________________________________________________________
+# Jump Point Search on a 4-connected grid with unit step costs
+# Among the optimal paths, only the canonical ones are searched: horizontal
+# moves come first and a vertical run only turns back to horizontal where it
+# is forced to (a wall blocked the row it would have used before). The search
+# only expands the jump points where canonical paths can turn, and skips the
+# cells in between with straight scans. It has the same optimal cost as A*.
+# Like the bidirectional searches below, it assumes that every move
+# costs 1: on a problem with a terrain it runs _weighted_search instead.
+
+_DIRECTION_ACTIONS = {(dx, dy): action for action, dx, dy in MOVES}
+
+
+def jumpPointSearch(problem):
+    """A* over the jump points of the MazeGrid of a grid problem, with the
+    Manhattan distance to the nearest goal as heuristic. Returns the goal
+    Node, whose path goes through every cell of the solution, or None."""
+    if not _unit_costs(problem):
+        return _weighted_search(problem)
+    grid = _problem_grid(problem)
+    width, height, walls = grid.width, grid.height, grid.walls
+    observer = problem.observer if problem.observer.enabled else None
+    goal_xy = list(problem.goal)
+    goals = bytearray(grid.size)
+    for x, y in goal_xy:
+        goals[x + y * width] = 1
+
+    def free(x, y):
+        return 0 <= x < width and 0 <= y < height and not walls[x + y * width]
+
+    def h(x, y):
+        return min(abs(x - gx) + abs(y - gy) for gx, gy in goal_xy) if goal_xy else 0
+
+    def jump_vertical(x, y, dy):
+        """Scan from (x, y) in direction dy, return the y of the jump point or None."""
+        while True:
+            y += dy
+            if not free(x, y):
+                return None
+            if goals[x + y * width]:
+                return y
+            if ((free(x - 1, y) and not free(x - 1, y - dy)) or
+                    (free(x + 1, y) and not free(x + 1, y - dy))):
+                return y  # a forced horizontal neighbor
+
+    def jump_horizontal(x, y, dx):
+        """Scan from (x, y) in direction dx, return the x of the jump point or None."""
+        while True:
+            x += dx
+            if not free(x, y):
+                return None
+            if goals[x + y * width]:
+                return x
+            if jump_vertical(x, y, 1) is not None or jump_vertical(x, y, -1) is not None:
+                return x
+
+    def directions(x, y, dx, dy):
+        """The canonical directions to leave (x, y) when it was reached by (dx, dy)."""
+        if dx == 0 and dy == 0:
+            return (-1, 0), (1, 0), (0, -1), (0, 1)
+        if dy == 0:
+            return (dx, 0), (0, 1), (0, -1)
+        forced = [(ex, 0) for ex in (-1, 1) if free(x + ex, y) and not free(x + ex, y - dy)]
+        return [(0, dy)] + forced
+
+    start = grid.cell_id(problem.initial)
+    g = {start: 0}
+    parent = {start: -1}
+    came = {start: (0, 0)}
+    closed = set()
+    frontier = [(h(*problem.initial), start)]
+    while frontier:
+        _, cell = heapq.heappop(frontier)
+        if cell in closed:
+            continue
+        if goals[cell]:
+            return _jump_solution_node(grid, parent, cell)
+        closed.add(cell)
+        problem._expanded += 1
+        x, y = grid.cells[cell]
+        children = []
+        for dx, dy in directions(x, y, *came[cell]):
+            if dy == 0:
+                x2, y2 = jump_horizontal(x, y, dx), y
+                if x2 is None:
+                    continue
+            else:
+                x2, y2 = x, jump_vertical(x, y, dy)
+                if y2 is None:
+                    continue
+            child = x2 + y2 * width
+            g2 = g[cell] + abs(x2 - x) + abs(y2 - y)
+            if child in closed or g2 >= g.get(child, _INFINITY):
+                continue
+            g[child] = g2
+            parent[child] = cell
+            came[child] = (dx, dy)
+            heapq.heappush(frontier, (g2 + h(x2, y2), child))
+            children.append(grid.cells[child])
+        if observer:
+            observer.expanded(grid.cells[cell], children)
+    return None
+
+
+def _jump_solution_node(grid, parent, cell):
+    """Rebuild the Node chain of a jump point path, filling in the cells
+    of the straight runs between consecutive jump points."""
+    jump_points = []
+    while cell != -1:
+        jump_points.append(grid.cells[cell])
+        cell = parent[cell]
+    jump_points.reverse()
+    node = Node(jump_points[0])
+    for x2, y2 in jump_points[1:]:
+        x, y = node.state
+        dx, dy = (x2 > x) - (x2 < x), (y2 > y) - (y2 < y)
+        action = _DIRECTION_ACTIONS[(dx, dy)]
+        while (x, y) != (x2, y2):
+            x, y = x + dx, y + dy
+            node = Node(grid.cells[x + y * grid.width], node, action, node.path_cost + 1)
+    return node
+
+
+# ______________________________________________________________________________
+# Bidirectional searches
+# They grow a forward tree from problem.initial (with problem.actions) and a
+# backward tree from the goals (with problem.predecessors), and join them
+# where they meet. When the goal is a single location, each tree only needs
+# to reach about half the depth of the solution.
+
+def _bidirectional_solution_node(problem, meet, forward_parent, backward_parent):
+    """Rebuild the Node chain from initial to a goal through meet.
+    forward_parent maps a state to (previous state, action), backward_parent
+    maps a state to (action, next state) on the way to the goal."""
+    states, actions = [meet], []
+    state = meet
+    while forward_parent[state] is not None:
+        state, action = forward_parent[state]
+        states.append(state)
+        actions.append(action)
+    states.reverse()
+    actions.reverse()
+    state = meet
+    while backward_parent[state] is not None:
+        action, state = backward_parent[state]
+        states.append(state)
+        actions.append(action)
+    node = Node(states[0])
+    for action, state in zip(actions, states[1:]):
+        node = Node(state, node, action, problem.path_cost(node.path_cost, node.state, action, state))
+    return node
+
+
+def _forward_moves(problem, state):
+    """The (action, state2) pairs reachable from state (the Grab of a goal is not a move)."""
+    return [(action, problem.get_successors(state, action))
+            for action in problem.actions(state) if action != Action.Grab]
+
+
+def bidirectionalBreadthFirstSearch(problem):
+    """Breadth-first search from both ends at once, one full layer at a time,
+    always on the side with the smaller frontier. The best meeting point of
+    the first layer that meets the other tree gives the shortest path."""
+    if not _unit_costs(problem):
+        return _weighted_search(problem)
+    goals = list(problem.goal) if isinstance(problem.goal, list) else [problem.goal]
+    observer = problem.observer if problem.observer.enabled else None
+    if problem.initial in goals:
+        return Node(problem.initial)
+    forward_parent, forward_depth = {problem.initial: None}, {problem.initial: 0}
+    backward_parent, backward_depth = dict.fromkeys(goals), dict.fromkeys(goals, 0)
+    forward_frontier, backward_frontier = [problem.initial], goals
+    while forward_frontier and backward_frontier:
+        forward = len(forward_frontier) <= len(backward_frontier)
+        if forward:
+            frontier, parent, depth, other_depth = forward_frontier, forward_parent, forward_depth, backward_depth
+        else:
+            frontier, parent, depth, other_depth = backward_frontier, backward_parent, backward_depth, forward_depth
+        next_frontier = []
+        best, meet = None, None
+        for state in frontier:
+            d = depth[state] + 1
+            moves = _forward_moves(problem, state) if forward else problem.predecessors(state)
+            children = []
+            for action, state2 in moves:
+                if state2 in depth:
+                    continue
+                depth[state2] = d
+                parent[state2] = (state, action) if forward else (action, state)
+                next_frontier.append(state2)
+                children.append(state2)
+                if state2 in other_depth and (best is None or d + other_depth[state2] < best):
+                    best, meet = d + other_depth[state2], state2
+            if observer:
+                observer.expanded(state, children)
+        if meet is not None:
+            return _bidirectional_solution_node(problem, meet, forward_parent, backward_parent)
+        if forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+    return None
+
+
+def bidirectionalAStarSearch(problem):
+    """A* from both ends at once on a grid problem, with the Manhattan distance
+    to the nearest goal forward and to the initial state backward (both
+    consistent with unit moves). Each step expands the side with the smaller
+    frontier, and the ties of f go to the deepest node of that side. The
+    best path found so far (of cost mu) is optimal as soon as
+    mu <= max(smallest forward f, smallest backward f): no path through an
+    unexpanded node can be cheaper.
+    It expands far fewer nodes than uniform cost search or
+    bidirectionalBreadthFirstSearch, but not fewer than aStarSearch with the
+    Manhattan heuristic: the two searches must run past their meeting point
+    until the bound proves mu optimal (see benchmarks.py bidirectional)."""
+    if not _unit_costs(problem):
+        return _weighted_search(problem)
+    goals = list(problem.goal) if isinstance(problem.goal, list) else [problem.goal]
+    observer = problem.observer if problem.observer.enabled else None
+    if problem.initial in goals:
+        return Node(problem.initial)
+    sx, sy = problem.initial
+
+    def h_forward(state):
+        x, y = state
+        return min(abs(x - gx) + abs(y - gy) for gx, gy in goals)
+
+    def h_backward(state):
+        x, y = state
+        return abs(x - sx) + abs(y - sy)
+
+    forward = {'g': {problem.initial: 0}, 'parent': {problem.initial: None}, 'closed': set(),
+               'frontier': [(h_forward(problem.initial), 0, problem.initial)], 'h': h_forward}
+    backward = {'g': dict.fromkeys(goals, 0), 'parent': dict.fromkeys(goals), 'closed': set(),
+                'frontier': [(h_backward(goal), 0, goal) for goal in goals], 'h': h_backward}
+    heapq.heapify(backward['frontier'])
+
+    def min_f(side):
+        """Drop the stale entries on top of the frontier and return its smallest f."""
+        frontier, g, closed = side['frontier'], side['g'], side['closed']
+        while frontier and (frontier[0][2] in closed or -frontier[0][1] > g[frontier[0][2]]):
+            heapq.heappop(frontier)
+        return frontier[0][0] if frontier else None
+
+    mu, meet = _INFINITY, None
+    while True:
+        f_forward, f_backward = min_f(forward), min_f(backward)
+        if f_forward is None or f_backward is None or mu <= max(f_forward, f_backward):
+            break
+        if len(forward['frontier']) <= len(backward['frontier']):
+            side, other = forward, backward
+        else:
+            side, other = backward, forward
+        _, minus_g, state = heapq.heappop(side['frontier'])
+        g_state = -minus_g
+        side['closed'].add(state)
+        moves = _forward_moves(problem, state) if side is forward else problem.predecessors(state)
+        children = []
+        for action, state2 in moves:
+            if side is forward:
+                g2 = problem.path_cost(g_state, state, action, state2)
+            else:
+                g2 = problem.path_cost(g_state, state2, action, state)
+            if state2 in side['closed'] or g2 >= side['g'].get(state2, _INFINITY):
+                continue
+            side['g'][state2] = g2
+            side['parent'][state2] = (state, action) if side is forward else (action, state)
+            heapq.heappush(side['frontier'], (g2 + side['h'](state2), -g2, state2))
+            children.append(state2)
+            if state2 in other['g'] and g2 + other['g'][state2] < mu:
+                mu, meet = g2 + other['g'][state2], state2
+        if observer:
+            observer.expanded(state, children)
+    if meet is None:
+        return None
+    return _bidirectional_solution_node(problem, meet, forward['parent'], backward['parent'])
+
+
+# ______________________________________________________________________________
+# Hierarchical path-finding: HPA*
+# The maze is cut into clusters and summarized once by a ClusterAbstraction
+# (see grid.py). A query only links the start and the goals to the abstract
+# nodes of their clusters, runs A* on the small abstract graph, and then
+# refines each abstract edge with a search restricted to one cluster. The
+# paths are near-optimal, not optimal. On a terrain, the abstraction is made
+# with the move costs, and the edges are directed: a move costs what the cell
+# it enters costs.
+
+def hierarchicalSearch(problem, cluster_size=10):
+    """HPA* on the MazeGrid of a grid problem. problem._expanded counts the
+    abstract nodes expanded plus the cells visited to link the start and the
+    goals and to refine the path (not the cached abstraction itself).
+    Returns the goal Node, or None."""
+    grid = _problem_grid(problem)
+    abstraction = grid.cluster_abstraction(cluster_size, None if _unit_costs(problem) else problem.costs)
+    observer = problem.observer if problem.observer.enabled else None
+    start = grid.cell_id(problem.initial)
+    goals = {grid.cell_id(goal) for goal in problem.goal if not grid.walls[grid.cell_id(goal)]}
+    if start in goals:
+        return Node(problem.initial)
+    links = {}  # the edges of start and goals, which are not abstract nodes
+
+    def link(cell, others):
+        cluster = abstraction.cluster_of(cell)
+        targets = set(abstraction.intra[cluster]) | set(others)
+        distances, _ = abstraction.cluster_bfs(cluster, cell, targets)
+        problem._expanded += len(distances)
+        for other in targets:
+            if other != cell and other in distances:
+                # the way back enters cell instead of other
+                back = distances[other] - abstraction.cost(other) + abstraction.cost(cell)
+                links.setdefault(cell, []).append((other, distances[other]))
+                links.setdefault(other, []).append((cell, back))
+
+    start_cluster = abstraction.cluster_of(start)
+    link(start, [goal for goal in goals if abstraction.cluster_of(goal) == start_cluster])
+    for goal in goals:
+        link(goal, [])
+
+    goal_xy = [grid.cells[goal] for goal in goals]
+
+    def h(cell):
+        x, y = grid.cells[cell]
+        return min(abs(x - gx) + abs(y - gy) for gx, gy in goal_xy)
+
+    g, parent, closed = {start: 0}, {start: None}, set()
+    frontier = [(h(start), 0, start)] if goals else []
+    reached = None
+    while frontier:
+        _, g_cell, cell = heapq.heappop(frontier)
+        if cell in closed:
+            continue
+        if cell in goals:
+            reached = cell
+            break
+        closed.add(cell)
+        problem._expanded += 1
+        children = []
+        for other, cost in abstraction.edges(cell) + links.get(cell, []):
+            g2 = g_cell + cost
+            if other in closed or g2 >= g.get(other, _INFINITY):
+                continue
+            g[other] = g2
+            parent[other] = cell
+            heapq.heappush(frontier, (g2 + h(other), g2, other))
+            children.append(grid.cells[other])
+        if observer:
+            observer.expanded(grid.cells[cell], children)
+    if reached is None:
+        return None
+
+    abstract_path = []
+    while reached is not None:
+        abstract_path.append(reached)
+        reached = parent[reached]
+    abstract_path.reverse()
+    path = [start]
+    for a, b in zip(abstract_path, abstract_path[1:]):
+        cluster = abstraction.cluster_of(a)
+        if cluster != abstraction.cluster_of(b):
+            path.append(b)  # crossing a border
+            continue
+        distances, parents = abstraction.cluster_bfs(cluster, a, [b])
+        problem._expanded += len(distances)
+        segment = []
+        while b != a:
+            segment.append(b)
+            b = parents[b]
+        path += reversed(segment)
+
+    node = Node(grid.cells[start])
+    for cell in path[1:]:
+        x, y = node.state
+        x2, y2 = grid.cells[cell]
+        node = Node(grid.cells[cell], node, _DIRECTION_ACTIONS[(x2 - x, y2 - y)],
+                    node.path_cost + abstraction.cost(cell))
+        if cell in goals:
+            break  # the refined path may cross another goal first
+    return node
+
+
+# ______________________________________________________________________________
+# Incremental replanning: D* Lite
+# D* Lite searches backward, from the goals to the agent, and keeps its g and
+# rhs tables between plans. When the agent moves, a goal disappears or a wall
+# changes, only the cells whose distance to the goals is affected are
+# repaired, instead of searching again from scratch.
+
+class DStarLite:
+    """A D* Lite planner on a 4-connected grid with unit moves, toward the
+    nearest of a set of goal states. g[c] is the current distance estimate of
+    cell c to the goals and rhs[c] its one-step lookahead; the cells where
+    they differ wait in the priority queue U (with lazy deletion: key_of[c]
+    is the key under which c is currently queued, or None)."""
+
+    def __init__(self, grid, start, goals):
+        self.width, self.height, self.size = grid.width, grid.height, grid.size
+        self.cells = grid.cells
+        self.walls = bytearray(grid.walls)  # our own copy: walls may be changed
+        self.g = [_INFINITY] * self.size
+        self.rhs = [_INFINITY] * self.size
+        self.key_of = [None] * self.size
+        self.U = []
+        self.km = 0
+        self.start = self.last = grid.cell_id(start)
+        self.goals = set()
+        self.expanded = 0  # vertex expansions of the last plan
+        for goal in goals:
+            self.add_goal(goal)
+
+    def h(self, cell):
+        """Manhattan distance between cell and the start (consistent for unit moves)."""
+        x, y = self.cells[cell]
+        sx, sy = self.cells[self.start]
+        return abs(x - sx) + abs(y - sy)
+
+    def key(self, cell):
+        k = min(self.g[cell], self.rhs[cell])
+        return k + self.h(cell) + self.km, k
+
+    def neighbors(self, cell):
+        """The free cells next to cell (moves are reversible, so they are both
+        its successors and its predecessors)."""
+        x, y = self.cells[cell]
+        width, walls = self.width, self.walls
+        result = []
+        if x > 0 and not walls[cell - 1]:
+            result.append(cell - 1)
+        if x < width - 1 and not walls[cell + 1]:
+            result.append(cell + 1)
+        if y > 0 and not walls[cell - width]:
+            result.append(cell - width)
+        if y < self.height - 1 and not walls[cell + width]:
+            result.append(cell + width)
+        return result
+
+    def update_vertex(self, cell):
+        if cell not in self.goals:
+            best = _INFINITY
+            if not self.walls[cell]:
+                g = self.g
+                for n in self.neighbors(cell):
+                    if g[n] + 1 < best:
+                        best = g[n] + 1
+            self.rhs[cell] = best
+        if self.g[cell] != self.rhs[cell]:
+            k = self.key(cell)
+            self.key_of[cell] = k
+            heapq.heappush(self.U, (k, cell))
+        else:
+            self.key_of[cell] = None
+
+    def compute_shortest_path(self):
+        U, g, rhs, key_of = self.U, self.g, self.rhs, self.key_of
+        start = self.start
+        while U:
+            k_old, cell = U[0]
+            if key_of[cell] != k_old:
+                heapq.heappop(U)  # stale entry
+                continue
+            if not (k_old < self.key(start) or rhs[start] != g[start]):
+                break
+            heapq.heappop(U)
+            k_new = self.key(cell)
+            if k_old < k_new:
+                key_of[cell] = k_new
+                heapq.heappush(U, (k_new, cell))
+                continue
+            key_of[cell] = None
+            self.expanded += 1
+            if g[cell] > rhs[cell]:
+                g[cell] = rhs[cell]
+            else:
+                g[cell] = _INFINITY
+                self.update_vertex(cell)
+            for n in self.neighbors(cell):
+                self.update_vertex(n)
+
+    def move_start(self, start):
+        """The agent moved to start: the keys already queued stay valid
+        thanks to the km offset."""
+        cell = start[0] + start[1] * self.width
+        if cell != self.start:
+            self.start = cell
+            self.km += self.h(self.last)
+            self.last = cell
+
+    def add_goal(self, goal):
+        cell = goal[0] + goal[1] * self.width
+        if cell not in self.goals:
+            self.goals.add(cell)
+            self.rhs[cell] = 0
+            self.update_vertex(cell)
+
+    def remove_goal(self, goal):
+        cell = goal[0] + goal[1] * self.width
+        if cell in self.goals:
+            self.goals.discard(cell)
+            self.update_vertex(cell)
+
+    def set_wall(self, state, wall=True):
+        """Add (or remove) a wall at state and repair the cells around it."""
+        cell = state[0] + state[1] * self.width
+        if bool(self.walls[cell]) == wall:
+            return
+        self.walls[cell] = 1 if wall else 0
+        self.update_vertex(cell)
+        x, y = state
+        for x2, y2 in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if 0 <= x2 < self.width and 0 <= y2 < self.height and not self.walls[x2 + y2 * self.width]:
+                self.update_vertex(x2 + y2 * self.width)
+
+    def update(self, grid, start, goals):
+        """Bring the planner up to date with the walls of grid, the position
+        of the agent and the remaining goals, repairing only what changed."""
+        goals = set(goals)
+        for cell in list(self.goals):
+            if self.cells[cell] not in goals:
+                self.remove_goal(self.cells[cell])
+        for goal in goals:
+            self.add_goal(goal)
+        if grid.walls != self.walls:
+            for cell, (old, new) in enumerate(zip(self.walls, grid.walls)):
+                if old != new:
+                    self.set_wall(self.cells[cell], bool(new))
+        self.move_start(start)
+
+    def plan(self):
+        """Repair the distances and return the Node of the goal reached from
+        the start by following the decreasing g values, or None."""
+        self.expanded = 0
+        self.compute_shortest_path()
+        cell = self.start
+        if self.g[cell] == _INFINITY and cell not in self.goals:
+            return None
+        node = Node(self.cells[cell])
+        while cell not in self.goals:
+            x, y = self.cells[cell]
+            cell = min(self.neighbors(cell), key=self.g.__getitem__)
+            x2, y2 = self.cells[cell]
+            action = _DIRECTION_ACTIONS[(x2 - x, y2 - y)]
+            node = Node(self.cells[cell], node, action, node.path_cost + 1)
+        return node
 
 
 # Abbreviations
@@ -129,4 +1348,13 @@ dfs = depthFirstSearch
 a_star = aStarSearch
 ucs = uniformCostSearch
 gs = greedyBestFirstSearch
+jps = jumpPointSearch
+bi_bfs = bidirectionalBreadthFirstSearch
+bi_a_star = bidirectionalAStarSearch
+hpa_star = hierarchicalSearch
+ida_star = iterativeDeepeningAStarSearch
+sma_star = simplifiedMemoryBoundedAStarSearch
+ara_star = anytimeRepairingAStarSearch
+ucs_bucket = bucketUniformCostSearch
+a_star_bucket = bucketAStarSearch
 
@@ -56,6 +56,7 @@ class Simulator(Tk):
         self.R3 = Radiobutton(self.top_frame, text="maze8x8", variable=self.simulator, value=2)
         self.R4 = Radiobutton(self.top_frame, text="maze10x10", variable=self.simulator, value=3)
         self.R5 = Radiobutton(self.top_frame, text="maze25x25", variable=self.simulator, value=4)
+        self.R6 = Radiobutton(self.top_frame, text="maze10x10 terrain", variable=self.simulator, value=5)
         self.simulator.set(0)
         self.separator2 = Separator(self.top_frame, orient='vertical')
 
@@ -67,6 +68,7 @@ class Simulator(Tk):
         self.R3.grid(row=0, column=4)
         self.R4.grid(row=0, column=5)
         self.R5.grid(row=0, column=6)
+        self.R6.grid(row=0, column=7)
 
         # create the center widgets
         self.center.grid_rowconfigure(0, weight=1)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the modules of DiamonFinder import each other by bare name, and the GUI
+# environments load their images relative to the working directory. The tests
+# live outside DiamonFinder: importing its package starts the Simulator.
+HERE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'DiamonFinder')
+sys.path.insert(0, HERE)
+os.chdir(HERE)
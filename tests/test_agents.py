@@ -0,0 +1,77 @@
+import random
+
+import agents
+from agents import Action, Agent, EnvironmentTemplate
+from diamond_2d_gui import build_diamond_explorer_environment, maze6x6
+
+
+def random_agent():
+    return Agent(lambda percept: random.choice(list(Action)))
+
+
+def lambda_environment():
+    """An environment that cannot be pickled: its agent runs a lambda."""
+    return build_diamond_explorer_environment(maze6x6, lambda: Agent(lambda percept: Action.NoOp))
+
+
+def test_template_of_unpicklable_environment():
+    env = lambda_environment()
+    template = EnvironmentTemplate(env)
+    copy1, copy2 = template.instantiate(), template.instantiate()
+    assert copy1 is not env and copy1 is not copy2
+    assert len(copy1.things) == len(env.things)
+
+
+def test_agent_in_unpicklable_environment():
+    env = lambda_environment()
+    nb_things = len(env.things)
+    scores = [agents.test_agent(random_agent, 10, [env], workers=workers) for workers in (1, 2)]
+    assert scores[0] == scores[1]
+    assert len(env.things) == nb_things
+
+
+def test_compare_agents_in_unpicklable_environment():
+    env = lambda_environment()
+    results = [agents.compare_agents(env, [random_agent], n=3, steps=10, workers=workers)
+               for workers in (1, 2)]
+    assert [score for _, score in results[0]] == [score for _, score in results[1]]
+
+
+def own_random_agent():
+    """An agent that draws from the generator AgentRuns gives it."""
+    agent = Agent(lambda percept: agent.random.choice(list(Action)))
+    return agent
+
+
+def test_agent_runs_are_reproducible_in_threads_and_processes(monkeypatch):
+    templates = [EnvironmentTemplate(lambda_environment()) for i in range(6)]
+    scores = [agents.run_agents([own_random_agent], templates, 20, workers=workers) for workers in (1, 3)]
+    monkeypatch.setattr(agents.multiprocessing, 'get_all_start_methods', lambda: ['spawn'])
+    scores.append(agents.run_agents([own_random_agent], templates, 20, workers=3))  # in threads
+    assert scores[0] == scores[1] == scores[2]
+
+
+def test_agent_runs_report_each_run():
+    templates = [EnvironmentTemplate(lambda_environment()) for i in range(3)]
+    reported = []
+    runs = agents.AgentRuns([own_random_agent, random_agent], templates, 10, workers=2)
+    runs.start(lambda a, i, future: reported.append((a, i, future.result())))
+    scores = runs.scores()
+    assert sorted(reported) == sorted((a, i, scores[a][i]) for a in range(2) for i in range(3))
+
+
+def test_agent_runs_of_module_random_agent_are_reproducible(monkeypatch):
+    templates = [EnvironmentTemplate(lambda_environment()) for i in range(6)]
+    state = random.getstate()
+    scores = [agents.run_agents([random_agent], templates, 20, workers=workers) for workers in (1, 3)]
+    monkeypatch.setattr(agents.multiprocessing, 'get_all_start_methods', lambda: ['spawn'])
+    scores += [agents.run_agents([random_agent], templates, 20, workers=3) for i in range(2)]  # in threads
+    assert scores[0] == scores[1] == scores[2] == scores[3]
+    assert random.getstate() == state
+
+
+def test_compare_agents_restores_the_random_state():
+    state = random.getstate()
+    results = [agents.compare_agents(lambda_environment, [random_agent], n=3, steps=10) for i in range(2)]
+    assert results[0] == results[1]
+    assert random.getstate() == state
@@ -0,0 +1,143 @@
+import pytest
+
+import grid
+import search_algorithms as sa
+from agents import Action, Agent
+from diamond_2d_gui import Diamond, DiamondMazeEnvironment
+from grid import generate_maze, generate_terrain
+from problem import NullObserver, StateCache
+from search import CompiledDiamondExplorerProblem
+from search_algorithms import cached_heuristic
+
+
+def random_problem(seed, size=20, terrain=False):
+    """A headless problem on a generated maze with 3 diamonds (and a random terrain)."""
+    maze = generate_maze(size, size, wall_density=0.25, nb_diamonds=3, seed=seed)
+    env = DiamondMazeEnvironment(maze, lambda e: Agent(lambda percept: Action.NoOp),
+                                 generate_terrain(size, size, seed=seed) if terrain else None)
+    return CompiledDiamondExplorerProblem(env, observer=NullObserver())
+
+
+def cost(node):
+    return node.path_cost if node else None
+
+
+def test_jump_point_search_is_optimal():
+    for seed in range(400):
+        expected = cost(sa.arrayUniformCostSearch(random_problem(seed)))
+        assert cost(sa.jumpPointSearch(random_problem(seed))) == expected, seed
+
+
+@pytest.mark.parametrize('search', [sa.bidirectionalBreadthFirstSearch, sa.bidirectionalAStarSearch],
+                         ids=lambda search: search.__name__)
+def test_bidirectional_searches_are_optimal(search):
+    for seed in range(400):
+        expected = cost(sa.arrayUniformCostSearch(random_problem(seed)))
+        assert cost(search(random_problem(seed))) == expected, seed
+
+
+UNIT_COST_SEARCHES = [sa.jumpPointSearch, sa.bidirectionalBreadthFirstSearch, sa.bidirectionalAStarSearch,
+                      sa.distanceFieldSearch]
+
+
+@pytest.mark.parametrize('search', UNIT_COST_SEARCHES, ids=lambda search: search.__name__)
+def test_unit_cost_searches_on_terrain_are_optimal(search):
+    for seed in range(200):
+        expected = cost(sa.arrayUniformCostSearch(random_problem(seed, terrain=True)))
+        assert cost(search(random_problem(seed, terrain=True))) == expected, seed
+
+
+def test_hierarchical_search_on_terrain_is_near_optimal():
+    for seed in range(200):
+        problem = random_problem(seed, terrain=True)
+        expected = cost(sa.arrayAStarSearch(random_problem(seed, terrain=True), sa.manhattanHeuristic))
+        node = sa.hierarchicalSearch(problem)
+        assert cost(node) is None if expected is None else cost(node) >= expected, seed
+        if node is not None:
+            path = node.path()
+            assert problem.is_goal_state(node.state) and path[0].state == problem.initial, seed
+            for previous, step in zip(path, path[1:]):
+                assert problem.get_successors(previous.state, step.action) == step.state, seed
+                assert step.path_cost == previous.path_cost + problem.costs[problem.grid.cell_id(step.state)], seed
+
+
+def test_latest_cluster_abstractions_are_bounded():
+    for size in range(4, 6 + grid.MAX_LATEST_ABSTRACTIONS):
+        grid.compile_maze(generate_maze(size, size, seed=size)).cluster_abstraction(3)
+    assert len(grid._latest_abstractions) == grid.MAX_LATEST_ABSTRACTIONS
+
+
+def free_states(problem):
+    return [state for state in problem.grid.cells if not problem.grid.walls[problem.grid.cell_id(state)]]
+
+
+def grab_a_diamond(problem):
+    """The problem of the next search of the agent, once a diamond is grabbed."""
+    env = problem.environment
+    env.delete_thing(env.list_things_at(problem.goal[0], Diamond)[0])
+    next_problem = CompiledDiamondExplorerProblem(env, observer=NullObserver())
+    assert len(next_problem.goal) == len(problem.goal) - 1
+    return next_problem
+
+
+@pytest.mark.parametrize('heuristic', [sa.manhattanHeuristic, sa.goalDistanceHeuristic,
+                                       sa.batchManhattanHeuristic, sa.batchGoalDistanceHeuristic],
+                         ids=lambda heuristic: heuristic.__name__)
+def test_cached_heuristic_is_emptied_when_the_goals_change(heuristic):
+    cache = StateCache()
+    cached = cached_heuristic(heuristic, cache)
+    problem = random_problem(3)
+    states = free_states(problem)
+    view = sa._StateView()
+    for problem in (problem, grab_a_diamond(problem)):
+        misses = cache.misses
+        for state in states:
+            view.state = state
+            assert cached(view, problem) == heuristic(view, problem)
+        assert cache.misses - misses == len(states)
+        assert cache.hits == 0
+
+
+def test_cached_batch_heuristic_scores_the_missing_states_at_once():
+    batches = []
+
+    @sa._BatchHeuristic
+    def heuristic(states, problem):
+        batches.append(len(states))
+        return sa.batchManhattanHeuristic.batch(states, problem)
+
+    cached = cached_heuristic(heuristic, StateCache())
+    problem = random_problem(3)
+    states = free_states(problem)
+    expected = sa.batchManhattanHeuristic.batch(states[:10], problem)
+    assert cached.batch(states[:10], problem).tolist() == expected.tolist()
+    cached.batch(states[:20], problem)
+    assert batches == [10, 10]
+
+
+@pytest.mark.parametrize('heuristic', [sa.manhattanHeuristic, sa.goalDistanceHeuristic, sa.landmarkHeuristic],
+                         ids=lambda heuristic: heuristic.__name__)
+def test_per_goal_cached_heuristic_is_shared_when_a_goal_is_removed(heuristic):
+    cache = StateCache()
+    cached = cached_heuristic(heuristic, cache, per_goal=True)
+    problem = random_problem(3)
+    states = free_states(problem)
+    view = sa._StateView()
+    for state in states:
+        view.state = state
+        assert cached(view, problem) == heuristic(view, problem)
+    problem2 = grab_a_diamond(problem)
+    misses = cache.misses
+    for state in states:
+        view.state = state
+        assert cached(view, problem2) == heuristic(view, problem2)
+    assert cache.misses == misses
+
+
+@pytest.mark.parametrize('search', [sa.aStarSearch, sa.bucketAStarSearch, sa.arrayAStarSearch],
+                         ids=lambda search: search.__name__)
+def test_a_star_with_goal_distances_expands_only_the_solution_path(search):
+    for seed in range(20):
+        problem = random_problem(seed)
+        node = search(problem, sa.goalDistanceHeuristic)
+        assert node is None or problem._expanded == node.path_cost, seed